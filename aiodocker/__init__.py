@@ -1,7 +1,13 @@
+from .cache import ResponseCache
 from .client import Docker
 from .exceptions import BuildError, ConflictError, NotFound
-from .exceptions import SparseError, CreateError
+from .exceptions import SparseError, CreateError, AmbiguousError
+from .exceptions import UnavailableError
 from .handlers import DockerHandler
+from .logs import LogCursor, LogMerge, LogRecord, LogRing
+from .mirror import StateMirror
+from .pool import DockerPool
+from .util import PrefixIndex
 
 # allow to extends aiodocker between multiple packages
 from pkgutil import extend_path
@@ -10,4 +16,6 @@ __path__ = extend_path(__path__, __name__)
 __version__ = '0.1'
 __all__ = ['BuildError', 'ConflictError', 'Docker',
            'DockerHandler', 'NotFound', 'SparseError',
-           'CreateError']
+           'CreateError', 'ResponseCache', 'StateMirror', 'AmbiguousError',
+           'PrefixIndex', 'DockerPool', 'UnavailableError', 'LogCursor',
+           'LogMerge', 'LogRecord', 'LogRing']
@@ -0,0 +1,270 @@
+from aiodocker.helpers import event_kind
+from aiodocker.util import task
+from collections import defaultdict, OrderedDict
+from copy import deepcopy
+from functools import wraps
+import asyncio
+import logging
+import time
+
+log = logging.getLogger(__name__)
+
+__all__ = ['ResponseCache', 'cached', 'invalidate']
+
+class ResponseCache:
+    """
+    Bounded LRU of decoded responses, with a ttl per endpoint.
+
+    Entries are also invalidated by the writes of the client and by the
+    events of the daemon, which are followed as soon as the cache is used by
+    a client.
+
+    Parameters:
+        maxsize (int): maximum of entries
+        ttl (dict): seconds an endpoint stays fresh,
+                    for example ``{'containers.inspect': 5}``
+        clock (callable): returns the current time in seconds
+    """
+
+    DEFAULT_TTL = {
+        'containers.inspect': 2,
+        'containers.items': 1,
+        'images.history': 60,
+        'images.inspect': 30,
+        'images.items': 10,
+        'misc.info': 2,
+        'misc.version': 300,
+    }
+
+    def __init__(self, maxsize=1024, *, ttl=None, clock=time.monotonic):
+        self.maxsize = maxsize
+        self.ttl = dict(self.DEFAULT_TTL, **(ttl or {}))
+        self.clock = clock
+        self.generation = 0
+        self.follower = None
+        self._entries = OrderedDict()
+        self._tags = defaultdict(set)
+        # generation of the last invalidation per tag, oldest first
+        self._invalidated = OrderedDict()
+        self._horizon = 0
+
+    def get(self, endpoint, key):
+        """
+        Returns:
+            object: a copy of the fresh entry
+        Raises:
+            KeyError: entry is missing or expired
+        """
+        name = endpoint, key
+        expires, value, tags = self._entries[name]
+        if expires <= self.clock():
+            self._discard(name)
+            raise KeyError(name)
+        self._entries.move_to_end(name)
+        return deepcopy(value)
+
+    def set(self, endpoint, key, value, *, generation=None, tags=()):
+        """
+        Parameters:
+            generation (int): the :attr:`generation` observed before fetching
+                              value. value is dropped if one of its tags was
+                              invalidated meanwhile
+            tags (iterable): refs the entry is invalidated by, in addition of
+                             the endpoint and the ids and names of value
+        """
+        ttl = self.ttl.get(endpoint)
+        if not ttl:
+            return
+        tags = {endpoint} | set(tags) | set(tags_of(value))
+        if generation is not None and self._stale(tags, generation):
+            return
+        name = endpoint, key
+        self._discard(name)
+        self._entries[name] = self.clock() + ttl, deepcopy(value), tags
+        for tag in tags:
+            self._tags[tag].add(name)
+        while len(self._entries) > self.maxsize:
+            self._discard(next(iter(self._entries)))
+
+    def invalidate(self, *tags):
+        """
+        Drops entries by endpoint name or by container/image id and name.
+        """
+        self.generation += 1
+        for tag in tags:
+            self._invalidated.pop(tag, None)
+            self._invalidated[tag] = self.generation
+            for name in list(self._tags.get(tag, ())):
+                self._discard(name)
+        while len(self._invalidated) > self.maxsize:
+            # forgotten tags make every older fetch stale
+            tag, self._horizon = self._invalidated.popitem(last=False)
+
+    def forget(self, kind, *refs):
+        """
+        Invalidates containers or images, and the listings they appear in.
+
+        Parameters:
+            kind (str): container or image
+            refs (str): ids or names
+        """
+        refs = [ref for ref in refs if ref]
+        if kind == 'container':
+            self.invalidate('containers.items', 'misc.info', *refs)
+        elif kind == 'image':
+            tags = ['images.items', 'misc.info']
+            for ref in refs:
+                tags.append(ref)
+                if ref.endswith(':latest'):
+                    # also referenced without the default tag
+                    tags.append(ref[:-len(':latest')])
+            self.invalidate(*tags)
+
+    def clear(self):
+        self.generation += 1
+        self._horizon = self.generation
+        self._invalidated.clear()
+        self._entries.clear()
+        self._tags.clear()
+
+    def feed(self, event):
+        """
+        Invalidates entries impacted by an event of the daemon.
+
+        Parameters:
+            event (dict): as streamed by /events
+        """
+        kind = event_kind(event)
+        actor = event.get('Actor', {})
+        ref = event.get('id') or actor.get('ID')
+        if kind in ('container', 'image'):
+            # tag events name the new tag in the attributes
+            name = actor.get('Attributes', {}).get('name')
+            self.forget(kind, ref, name)
+
+    def follow(self, api):
+        """
+        Starts feeding the cache with the events of the daemon.
+
+        Parameters:
+            api (DockerHandler): the handler which uses the cache
+        """
+        if self.follower is None:
+            from aiodocker.endpoints.events import EventStream
+            events = EventStream(api, since=int(time.time()))
+            self.follower = self._follow(events)
+        return self.follower
+
+    @task
+    def _follow(self, events):
+        try:
+            while True:
+                event = yield from events.read()
+                if event is None:
+                    break
+                self.feed(event)
+        except asyncio.CancelledError:
+            raise
+        except Exception as error:
+            log.warn('cache stops following events %s', error)
+        finally:
+            # nothing invalidates the entries anymore
+            events.close()
+            self.follower = None
+            self.clear()
+
+    def close(self):
+        if self.follower is not None:
+            self.follower.cancel()
+
+    def _stale(self, tags, generation):
+        if generation < self._horizon:
+            return True
+        return any(self._invalidated.get(tag, 0) > generation
+                   for tag in tags)
+
+    def _discard(self, name):
+        entry = self._entries.pop(name, None)
+        if entry:
+            for tag in entry[2]:
+                names = self._tags.get(tag)
+                if names:
+                    names.discard(name)
+                    if not names:
+                        del self._tags[tag]
+
+    def __len__(self):
+        return len(self._entries)
+
+
+def tags_of(value):
+    if isinstance(value, dict):
+        for field in ('id', 'Id', 'name', 'Name'):
+            if isinstance(value.get(field), str):
+                yield value[field]
+        for field in ('repo_tags', 'RepoTags'):
+            for tag in value.get(field) or ():
+                yield tag
+
+
+def freeze(value):
+    """
+    Converts lists, sets and dicts into tuples, so that value is hashable.
+
+    >>> freeze({'label': ['foo', 'bar=baz']})
+    (('label', ('foo', 'bar=baz')),)
+    """
+    if isinstance(value, dict):
+        return tuple(sorted((key, freeze(item))
+                            for key, item in value.items()))
+    if isinstance(value, (set, frozenset)):
+        return tuple(sorted(freeze(item) for item in value))
+    if isinstance(value, (list, tuple)):
+        return tuple(freeze(item) for item in value)
+    return value
+
+
+def cached(endpoint):
+    """
+    Serves the decorated method from ``self.api.cache``, when one is set.
+
+    Parameters:
+        endpoint (str): the name of the endpoint, ttl depends on it
+    """
+
+    def decorate(func):
+        coro = asyncio.coroutine(func)
+
+        @wraps(func)
+        def wrapper(self, *args, **kwargs):
+            cache = self.api.cache
+            if cache is None:
+                return (yield from coro(self, *args, **kwargs))
+
+            cache.follow(self.api)
+            key = freeze(args), freeze(kwargs)
+            try:
+                return cache.get(endpoint, key)
+            except KeyError:
+                pass
+            generation = cache.generation
+            response = yield from coro(self, *args, **kwargs)
+            refs = [arg for arg in args if isinstance(arg, str)]
+            cache.set(endpoint, key, response,
+                      generation=generation, tags=refs)
+            return response
+        return wrapper
+    return decorate
+
+
+def invalidate(api, kind, *refs):
+    """
+    Drops the entries made stale by a successful write of the client.
+
+    Parameters:
+        api (DockerHandler): the handler of the client
+        kind (str): container or image
+        refs (str): ids or names
+    """
+    if api.cache is not None:
+        api.cache.forget(kind, *refs)
@@ -1,7 +1,8 @@
 from . import endpoints
+from .cache import ResponseCache
 from .handlers import DockerHandler
 from .util import lazy_property, get_config_from_env
-import os
+import asyncio
 import logging
 
 __all__ = ['Docker']
@@ -11,29 +12,75 @@ log = logging.getLogger(__name__)
 
 class Docker:
 
-    def __init__(self, host=None, *, cert_path=None, tls_verify=None, **opts):
+    def __init__(self, host=None, *, version=None, cert_path=None,
+                 tls_verify=None, pool_size=None, stream_pool_size=None,
+                 keepalive_timeout=30, coalesce=False, cache=None, **opts):
         """
 
+        Parameters:
+            version (str): api version. negotiated with the daemon if None
+            pool_size (int): maximum of simultaneous request/response
+                             connections
+            stream_pool_size (int): maximum of simultaneous streaming
+                                    connections (logs, stats, pull...)
+            keepalive_timeout (float): seconds idle connections are kept
+            coalesce (bool): concurrent identical reads share one request
+            cache (bool, ResponseCache): cache responses of read endpoints
+
         .. note::
             arguments must follow the DOCKER_VARS
         """
 
-        version = '1.17'
-        self.api = DockerHandler(host, version, cert_path, tls_verify)
+        if cache is True:
+            cache = ResponseCache()
+        elif cache is False:
+            cache = None
+        self.api = DockerHandler(host, version, cert_path, tls_verify,
+                                 pool_size=pool_size,
+                                 stream_pool_size=stream_pool_size,
+                                 keepalive_timeout=keepalive_timeout,
+                                 coalesce=coalesce,
+                                 cache=cache)
         if opts:
             log.warn('Don\'t know how to handle %s' % opts)
 
     @classmethod
-    def local_client(cls):
+    def local_client(cls, **opts):
         """
         Scaffold a local client with env variables.
+
+        Parameters:
+            opts: overrides env variables
+        """
+
+        config = get_config_from_env()
+        config.setdefault('host', 'http://127.0.0.1:3000')
+        config.setdefault('tls_verify', False)
+        config.setdefault('cert_path', '~/.docker')
+        if 'api_version' in config:
+            config['version'] = config.pop('api_version')
+        config.update(opts)
+        return cls(**config)
+
+    def close(self):
+        """
+        Release the connections held by the client.
         """
+        self.api.close()
 
-        opts = get_config_from_env()
-        opts.setdefault('host', 'http://127.0.0.1:3000')
-        opts.setdefault('tls_verify', False)
-        opts.setdefault('cert_path', '~/.docker')
-        return cls(**opts)
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    @asyncio.coroutine
+    def __aenter__(self):
+        return self
+
+    @asyncio.coroutine
+    def __aexit__(self, *exc):
+        self.close()
 
     @lazy_property
     def containers(self):
@@ -47,6 +94,10 @@ class Docker:
     def executors(self):
         return endpoints.ExecEndpoint(self.api)
 
+    @lazy_property
+    def events(self):
+        return endpoints.EventsEndpoint(self.api)
+
     @lazy_property
     def misc(self):
         return endpoints.MiscEndpoint(self.api)
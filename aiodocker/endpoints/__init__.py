@@ -1,8 +1,11 @@
-from .containers import ContainersEndpoint
-from .executors import ExecEndpoint
+from .containers import ContainersEndpoint, ContainerLog, LogStream
+from .events import EventsEndpoint, EventStream
+from .executors import ExecEndpoint, ExecResult, ExecRun
 from .images import ImagesEndpoint
 from .misc import MiscEndpoint
 from .registries import DockerHubEndpoint, RegistryEndpoint
 
 __all__ = ['ContainersEndpoint', 'ImagesEndpoint', 'MiscEndpoint',
-           'DockerHubEndpoint', 'RegistryEndpoint', 'ExecEndpoint']
+           'DockerHubEndpoint', 'RegistryEndpoint', 'ExecEndpoint',
+           'EventsEndpoint', 'EventStream', 'ContainerLog', 'LogStream',
+           'ExecResult', 'ExecRun']
@@ -1,12 +1,18 @@
+from aiodocker.cache import cached, invalidate
 from aiodocker.exceptions import ServerError, UnexpectedError, ConflictError
 from aiodocker.exceptions import NotFound, NotRunning, ValidationError
 from aiodocker.formatters import from_containers
 from aiodocker.formatters import from_container_inspect
 from aiodocker.formatters import from_container_top
 from aiodocker.formatters import to_container_config
-from aiodocker.helpers import stream_raw
-from aiodocker.util import task
+from aiodocker.helpers import stream_raw, AttachStream
+from aiodocker.helpers import JSONStream, copy_stream, to_timestamp
+from aiodocker.logs import LogCursor, LogMerge, LogRing
+from aiodocker.stats import StatsStream
+from aiodocker.util import AsyncIterator, task, gather_bounded, TarStream
+from collections import OrderedDict
 from copy import copy
+from functools import partial
 import asyncio
 import json
 import logging
@@ -20,11 +26,13 @@ class ContainersEndpoint:
         self.api = api
 
     @task
-    def items(self, *, status=None):
+    @cached('containers.items')
+    def items(self, *, status=None, label=None):
         """List containers.
         Parameters:
             status (int, str): a status. one of restarting, running, paused or
                                exited. if int, it is the exit code
+            label (str, list): key or key=value labels. requires api 1.18
         """
         path = '/containers/json'
         params = {
@@ -42,6 +50,12 @@ class ContainersEndpoint:
         else:
             params['all'] = False
 
+        if label is not None:
+            if not (yield from self.api.supports('1.18')):
+                raise ValidationError('filter by label requires api 1.18')
+            filters = params.setdefault('filters', {})
+            filters['label'] = [label] if isinstance(label, str) else label
+
         response = yield from self.api.get(path, params=params)
         if response.status == 200:
             data = yield from response.json()
@@ -80,6 +94,7 @@ class ContainersEndpoint:
             data = yield from response.json()
             for warn in (data.get('Warnings') or []):
                 log.warn(warn)
+            invalidate(self.api, 'container', name)
             return data['Id']
 
         data = yield from response.text()
@@ -94,6 +109,7 @@ class ContainersEndpoint:
         raise UnexpectedError(response.status, data)
 
     @task
+    @cached('containers.inspect')
     def inspect(self, ref):
         path = '/containers/%s/json' % ref
 
@@ -130,12 +146,35 @@ class ContainersEndpoint:
             raise ServerError(data)
         raise UnexpectedError(response.status, data)
 
-    def log(self, ref, *, stdout=None, stderr=None):
+    def log(self, ref, *, stdout=None, stderr=None, tty=None):
         """
+        Parameters:
+            tty (bool): the container has a tty. None means inspect it
         Returns:
             ContainerLog: iterable through latest logs
         """
-        return ContainerLog(self.api, ref, stdout=stdout, stderr=stderr)
+        return ContainerLog(self.api, ref, stdout=stdout, stderr=stderr,
+                            tty=tty)
+
+    def merged_logs(self, refs, *, stdout=None, stderr=None, tail='all',
+                    lag=1, lags=None, maxsize=64):
+        """Follow the logs of many containers, merged by timestamp.
+
+        Parameters:
+            refs (list): container refs
+            tail (int, str): lines of every container to start with
+            lag (float): seconds a silent container is waited for before
+                         delivering the records of the others
+            lags (dict): seconds per container ref, instead of lag
+            maxsize (int): maximum of frames read ahead per container
+        Returns:
+            LogMerge: async iterator of (ref, LogRecord)
+        """
+        cursors = OrderedDict()
+        for ref in refs:
+            logs = self.log(ref, stdout=stdout, stderr=stderr).tail(tail)
+            cursors[ref] = logs.cursor(maxsize=maxsize)
+        return LogMerge(cursors, lag=lag, lags=lags)
 
     @task
     def changes(self, ref):
@@ -154,18 +193,59 @@ class ContainersEndpoint:
         raise UnexpectedError(response.status, data)
 
     @task
-    def export(self, ref):
+    def export(self, ref, *, into, compress=False, chunk_size=1048576,
+               progress=None):
+        """Export the filesystem of a container as a tarball.
+
+        The tarball is streamed into the sink, it is never held in memory.
+
+        Parameters:
+            into: a file descriptor, a file, a socket, a StreamWriter or
+                  anything with a write method (which may be a coroutine)
+            compress (bool): gzip the tarball, in a worker thread
+            chunk_size (int): bytes written at once
+            progress (callable): called with (bytes read, bytes per second)
+        Returns:
+            int: size of the tarball
+        """
         path = '/containers/%s/export' % ref
-        # response = yield from self.api.get(path)
-        raise NotImplementedError()
+
+        response = yield from self.api.get(path, stream=True)
+        if response.status == 200:
+            try:
+                return (yield from copy_stream(response, into,
+                                               chunk_size=chunk_size,
+                                               compress=compress,
+                                               progress=progress))
+            finally:
+                response.close()
+
+        data = yield from response.text()
+        if response.status == 404:
+            raise NotFound(data)
+        elif response.status == 500:
+            raise ServerError(data)
+        raise UnexpectedError(response.status, data)
 
     @task
     def stats(self, ref):
+        """
+        Returns:
+            dict: one sample of the resource usage
+        """
         path = '/containers/%s/stats' % ref
+        oneshot = yield from self.api.supports('1.19')
+        params = {
+            'stream': False if oneshot else None
+        }
 
-        response = yield from self.api.get(path)
+        response = yield from self.api.get(path, params=params,
+                                           stream=not oneshot)
         if response.status == 200:
-            data = yield from response.json()
+            # older daemons can only stream, keep the first sample
+            stream = JSONStream(response)
+            data = yield from stream.read()
+            stream.close()
             return data
 
         data = yield from response.text()
@@ -175,6 +255,18 @@ class ContainersEndpoint:
             raise ServerError(data)
         raise UnexpectedError(response.status, data)
 
+    def stats_stream(self, ref, *, interval=None, raw=False):
+        """Monitor the resource usage.
+
+        Parameters:
+            interval (float): minimum of seconds between two samples,
+                              documents received meanwhile are not decoded
+            raw (bool): stream the documents of docker instead of samples
+        Returns:
+            StatsStream: async iterator of samples, see :func:`usage`
+        """
+        return StatsStream(self.api, ref, interval=interval, raw=raw)
+
     @task
     def resize_tty(self, ref, *, height, width):
         path = '/containers/%s/resize' % ref
@@ -185,6 +277,7 @@ class ContainersEndpoint:
 
         response = yield from self.api.post(path, params=params)
         if response.status == 200:
+            yield from response.release()
             return True
 
         data = yield from response.text()
@@ -203,8 +296,11 @@ class ContainersEndpoint:
         path = '/containers/%s/start' % ref
         response = yield from self.api.post(path)
         if response.status == 204:
+            yield from response.release()
+            invalidate(self.api, 'container', ref)
             return True
         elif response.status == 304:
+            yield from response.release()
             return False
 
         data = yield from response.text()
@@ -226,8 +322,11 @@ class ContainersEndpoint:
         }
         response = yield from self.api.post(path, params=params)
         if response.status == 204:
+            yield from response.release()
+            invalidate(self.api, 'container', ref)
             return True
         elif response.status == 304:
+            yield from response.release()
             return False
 
         data = yield from response.text()
@@ -245,6 +344,8 @@ class ContainersEndpoint:
         }
         response = yield from self.api.post(path, params=params)
         if response.status == 204:
+            yield from response.release()
+            invalidate(self.api, 'container', ref)
             return True
 
         data = yield from response.text()
@@ -262,6 +363,8 @@ class ContainersEndpoint:
         }
         response = yield from self.api.post(path, params=params)
         if response.status == 204:
+            yield from response.release()
+            invalidate(self.api, 'container', ref)
             return True
 
         data = yield from response.text()
@@ -279,6 +382,8 @@ class ContainersEndpoint:
         }
         response = yield from self.api.post(path, params=params)
         if response.status == 204:
+            yield from response.release()
+            invalidate(self.api, 'container', ref, name)
             return True
 
         data = yield from response.text()
@@ -295,6 +400,8 @@ class ContainersEndpoint:
         path = '/containers/%s/pause' % ref
         response = yield from self.api.post(path)
         if response.status == 204:
+            yield from response.release()
+            invalidate(self.api, 'container', ref)
             return True
 
         data = yield from response.text()
@@ -309,6 +416,8 @@ class ContainersEndpoint:
         path = '/containers/%s/unpause' % ref
         response = yield from self.api.post(path)
         if response.status == 204:
+            yield from response.release()
+            invalidate(self.api, 'container', ref)
             return True
 
         data = yield from response.text()
@@ -319,15 +428,49 @@ class ContainersEndpoint:
         raise UnexpectedError(response.status, data)
 
     @task
-    def attach(self, ref):
+    def attach(self, ref, *, stdin=True, stdout=True, stderr=True,
+               logs=False, tty=None):
+        """Attach to a container.
+
+        Parameters:
+            stdin (bool): attach stdin, the container must be created
+                          with open_stdin
+            stdout (bool): attach stdout
+            stderr (bool): attach stderr
+            logs (bool): replay the logs first
+            tty (bool): the container has a tty. None means inspect it
+        Returns:
+            AttachStream: read stdout and stderr, write stdin
+        """
         path = '/containers/%s/attach' % ref
-        # response = yield from self.api.post(path)
-        raise NotImplementedError()
+        if tty is None:
+            data = yield from self.inspect(ref)
+            tty = bool(data['config']['tty'])
+        params = {
+            'stream': True,
+            'stdin': stdin,
+            'stdout': stdout,
+            'stderr': stderr,
+            'logs': logs
+        }
+
+        response = yield from self.api.hijack('POST', path, params=params)
+        if response.status in (101, 200):
+            return AttachStream(response, tty=tty)
+
+        data = yield from response.text()
+        if response.status == 400:
+            raise ValidationError(data)
+        elif response.status == 404:
+            raise NotFound(data)
+        elif response.status == 500:
+            raise ServerError(data)
+        raise UnexpectedError(response.status, data)
 
     @task
     def wait(self, ref):
         path = '/containers/%s/wait' % ref
-        response = yield from self.api.post(path)
+        response = yield from self.api.post(path, stream=True)
         if response.status == 200:
             data = yield from response.json()
             return data
@@ -348,8 +491,11 @@ class ContainersEndpoint:
         }
         response = yield from self.api.delete(path, params=params)
         if response.status == 204:
+            yield from response.release()
+            invalidate(self.api, 'container', ref)
             return True
         elif response.status == 404:
+            yield from response.release()
             return False
 
         data = yield from response.text()
@@ -363,39 +509,267 @@ class ContainersEndpoint:
 
     delete = remove
 
+    @task
+    def start_many(self, refs, *, concurrency=10):
+        """Start many containers.
+
+        Parameters:
+            refs (iterable): ids or names
+            concurrency (int): maximum of simultaneous calls
+        Returns:
+            OrderedDict: result or exception of :meth:`start` per ref
+        """
+        return (yield from self._many(self.start, refs,
+                                      concurrency=concurrency))
+
+    @task
+    def stop_many(self, refs, *, wait=None, concurrency=10, grace=5):
+        """Stop many containers.
+
+        Every call is given wait + grace seconds before failing with a
+        TimeoutError, so that a stuck daemon cannot hang the batch.
+
+        Parameters:
+            refs (iterable): ids or names
+            wait (int): seconds the daemon waits before killing containers.
+                        defaults to 10, like the daemon
+            concurrency (int): maximum of simultaneous calls
+            grace (float): extra seconds allowed to every call
+        Returns:
+            OrderedDict: result or exception of :meth:`stop` per ref
+        """
+        timeout = (10 if wait is None else wait) + grace
+        return (yield from self._many(self.stop, refs,
+                                      concurrency=concurrency,
+                                      timeout=timeout,
+                                      wait=wait))
+
+    @task
+    def restart_many(self, refs, *, wait=None, concurrency=10, grace=5):
+        """Restart many containers.
+
+        Parameters:
+            refs (iterable): ids or names
+            wait (int): seconds the daemon waits before killing containers.
+                        defaults to 10, like the daemon
+            concurrency (int): maximum of simultaneous calls
+            grace (float): extra seconds allowed to every call
+        Returns:
+            OrderedDict: result or exception of :meth:`restart` per ref
+        """
+        timeout = (10 if wait is None else wait) + grace
+        return (yield from self._many(self.restart, refs,
+                                      concurrency=concurrency,
+                                      timeout=timeout,
+                                      wait=wait))
+
+    @task
+    def kill_many(self, refs, *, signal=None, concurrency=10):
+        """Kill many containers.
+
+        Parameters:
+            refs (iterable): ids or names
+            signal (str): signal to send
+            concurrency (int): maximum of simultaneous calls
+        Returns:
+            OrderedDict: result or exception of :meth:`kill` per ref
+        """
+        return (yield from self._many(self.kill, refs,
+                                      concurrency=concurrency,
+                                      signal=signal))
+
+    @task
+    def remove_many(self, refs, *, also_volumes=False, force=False,
+                    concurrency=10):
+        """Remove many containers.
+
+        Parameters:
+            refs (iterable): ids or names
+            also_volumes (bool): remove their volumes too
+            force (bool): kill them before removal
+            concurrency (int): maximum of simultaneous calls
+        Returns:
+            OrderedDict: result or exception of :meth:`remove` per ref
+        """
+        return (yield from self._many(self.remove, refs,
+                                      concurrency=concurrency,
+                                      also_volumes=also_volumes,
+                                      force=force))
+
+    delete_many = remove_many
+
+    @asyncio.coroutine
+    def _many(self, method, refs, *, concurrency, timeout=None, **kwargs):
+        refs = list(OrderedDict.fromkeys(refs))
+        calls = [partial(method, ref, **kwargs) for ref in refs]
+        results = yield from gather_bounded(calls,
+                                            concurrency=concurrency,
+                                            timeout=timeout)
+        return OrderedDict(zip(refs, results))
+
     @task
     def copy(self, ref, *, resource):
-        path = '/containers/%s' % ref
+        """Copy files or folders out of a container.
+
+        Uses :meth:`get_archive` when the daemon supports it.
+
+        Parameters:
+            resource (str): path in the container
+        Returns:
+            TarStream: async iterator of TarMember, as they are received
+        """
+        supported = yield from self.api.supports('1.20')
+        if supported:
+            return (yield from self.get_archive(ref, path=resource))
+
+        path = '/containers/%s/copy' % ref
         data = {
             'Resource': resource
         }
-        # response = yield from self.api.delete(path, data=json.dumps(data))
-        raise NotImplementedError()
+        headers = {
+            'Content-Type': 'application/json'
+        }
+
+        response = yield from self.api.post(path,
+                                            headers=headers,
+                                            data=json.dumps(data),
+                                            stream=True)
+        if response.status == 200:
+            return TarStream(response)
+
+        data = yield from response.text()
+        if response.status == 404:
+            raise NotFound(data)
+        elif response.status == 500:
+            raise ServerError(data)
+        raise UnexpectedError(response.status, data)
+
+    @task
+    def get_archive(self, ref, *, path):
+        """Get an archive of a path in a container. requires api 1.20
+
+        Returns:
+            TarStream: async iterator of TarMember, as they are received
+        """
+        supported = yield from self.api.supports('1.20')
+        if not supported:
+            raise ValidationError('archive requires api 1.20')
+        params = {
+            'path': path
+        }
+
+        response = yield from self.api.get('/containers/%s/archive' % ref,
+                                           params=params,
+                                           stream=True)
+        if response.status == 200:
+            return TarStream(response)
+
+        data = yield from response.text()
+        if response.status == 400:
+            raise ValidationError(data)
+        elif response.status == 404:
+            raise NotFound(data)
+        elif response.status == 500:
+            raise ServerError(data)
+        raise UnexpectedError(response.status, data)
+
+    @task
+    def put_archive(self, ref, *, path, data, no_overwrite_dir_non_dir=False):
+        """Extract an archive into a directory of a container.
+        requires api 1.20
+
+        Parameters:
+            path (str): the directory, it must exist
+            data (bytes, file): the tar archive
+            no_overwrite_dir_non_dir (bool): fail when a directory would
+                                             replace a file, or the reverse
+        Returns:
+            bool: True
+        """
+        supported = yield from self.api.supports('1.20')
+        if not supported:
+            raise ValidationError('archive requires api 1.20')
+        params = {
+            'path': path,
+            'noOverwriteDirNonDir': no_overwrite_dir_non_dir
+        }
+        headers = {
+            'Content-Type': 'application/x-tar'
+        }
+
+        response = yield from self.api.put('/containers/%s/archive' % ref,
+                                           params=params,
+                                           headers=headers,
+                                           data=data)
+        if response.status == 200:
+            yield from response.release()
+            return True
+
+        data = yield from response.text()
+        if response.status in (400, 403):
+            raise ValidationError(data)
+        elif response.status == 404:
+            raise NotFound(data)
+        elif response.status == 500:
+            raise ServerError(data)
+        raise UnexpectedError(response.status, data)
 
 
 class ContainerLog:
 
-    def __init__(self, api, ref, *, stdout=None, stderr=None):
+    def __init__(self, api, ref, *, stdout=None, stderr=None, tty=None):
         self.api = api
         self.ref = ref
         self.stdout = stdout
         self.stderr = stderr
+        self.tty = tty
         self._tail = 'all'
 
     @asyncio.coroutine
     def __iter__(self):
+        return (yield from self.open())
 
+    @asyncio.coroutine
+    def open(self, *, follow=False, since=None, tty=None):
+        """
+        Parameters:
+            follow (bool): keep the stream open for new logs
+            since (int, datetime): only logs since this time.
+                                   requires api 1.19
+            tty (bool): the container has a tty. None means :attr:`tty`,
+                        which is inspected once when unknown
+        Returns:
+            RawStream: the frames, as they arrive. logs of a tty are read
+                       line by line, everything is stdout
+        """
         path = '/containers/%s/logs' % self.ref
+        if tty is None:
+            if self.tty is None:
+                data = yield from ContainersEndpoint(self.api).inspect(
+                    self.ref)
+                self.tty = bool(data['config']['tty'])
+            tty = self.tty
+        stdout, stderr = self.stdout, self.stderr
+        if stdout is None and stderr is None:
+            # docker wants at least one of them
+            stdout, stderr = True, True
         params = {
-            'stdout': self.stdout,
-            'stderr': self.stderr,
+            'stdout': stdout,
+            'stderr': stderr,
             'timestamps': True,
+            'follow': follow,
             'tail': self._tail
         }
-
-        response = yield from self.api.get(path, params=params)
+        if since is not None:
+            supported = yield from self.api.supports('1.19')
+            if not supported:
+                raise ValidationError('since requires api 1.19')
+            params['since'] = to_timestamp(since)
+
+        response = yield from self.api.get(path, params=params,
+                                           stream=True)
         if response.status == 200:
-            return stream_raw(response)
+            return stream_raw(response, tty=tty, lines=tty)
 
         data = yield from response.text()
         if response.status == 404:
@@ -421,6 +795,110 @@ class ContainerLog:
         instance._tail = count
         return instance
 
-    def follow(self):
-        # TODO finish logs, with log follows
-        raise NotImplementedError()
+    def follow(self, *, since=None, maxsize=64):
+        """Follow the logs, starting with the tail.
+
+        Parameters:
+            since (int, datetime): only logs since this time.
+                                   requires api 1.19
+            maxsize (int): maximum of frames read ahead of the consumer
+        Returns:
+            LogStream: async iterator of (stream id, memoryview)
+        """
+        return LogStream(self, since=since, maxsize=maxsize)
+
+    def cursor(self, *, last=None, reconnect=True, maxsize=64):
+        """Follow the logs as records, across reconnections.
+
+        Parameters:
+            last (int): timestamp in nanoseconds of the last record already
+                        delivered, for resuming a previous cursor
+            reconnect (bool): reconnect when the connection is lost
+            maxsize (int): maximum of frames read ahead of the consumer
+        Returns:
+            LogCursor: async iterator of LogRecord
+        """
+        return LogCursor(self, last=last, reconnect=reconnect,
+                         maxsize=maxsize)
+
+    def ring(self, *, size=1048576, lines=10000):
+        """Keep the last logs in a fixed amount of memory.
+
+        Parameters:
+            size (int): bytes of payload kept
+            lines (int): records kept
+        Returns:
+            LogRing: to be started
+        """
+        return LogRing(self, size=size, lines=lines)
+
+
+class LogStream(AsyncIterator):
+    """
+    Followed logs of a container.
+
+    Frames are read ahead of the consumer by a task, into a queue of at
+    most maxsize frames. The task stops reading the socket while the queue
+    is full, so a slow consumer throttles the daemon instead of filling the
+    memory.
+    """
+
+    def __init__(self, log, *, since=None, maxsize=64):
+        if maxsize < 1:
+            raise ValidationError('maxsize must be positive')
+        self.log = log
+        self.since = since
+        self.maxsize = maxsize
+        self.closed = False
+        self._queue = asyncio.Queue(maxsize)
+        self._reader = None
+        self._done = False
+        self._error = None
+
+    @asyncio.coroutine
+    def read(self):
+        """
+        Returns:
+            tuple: (stream id, memoryview), None when the stream is over
+        """
+        if self.closed:
+            return None
+        if self._reader is None:
+            self._reader = self._read_ahead()
+        while True:
+            if self._done and self._queue.empty():
+                error, self._error = self._error, None
+                if error is not None:
+                    raise error
+                return None
+            frame = yield from self._queue.get()
+            if frame is not None:
+                return frame
+
+    @task
+    def _read_ahead(self):
+        stream = None
+        try:
+            stream = yield from self.log.open(follow=True, since=self.since)
+            while True:
+                frame = yield from stream.read()
+                if frame is None:
+                    break
+                # blocks while the queue is full
+                yield from self._queue.put(frame)
+        except asyncio.CancelledError:
+            raise
+        except Exception as error:
+            self._error = error
+        finally:
+            self._done = True
+            if stream is not None:
+                stream.close()
+            if self._queue.empty():
+                # wakes up a pending read
+                self._queue.put_nowait(None)
+
+    def close(self):
+        self.closed = True
+        if self._reader is not None:
+            self._reader.cancel()
@@ -0,0 +1,158 @@
+from aiodocker.exceptions import ServerError, UnexpectedError
+from aiodocker.exceptions import ValidationError
+from aiodocker.helpers import JSONStream, to_timestamp
+from aiodocker.util import AsyncIterator, task
+import aiohttp
+import asyncio
+import logging
+import time
+
+log = logging.getLogger(__name__)
+
+
+class EventsEndpoint:
+
+    def __init__(self, api):
+        self.api = api
+
+    def stream(self, *, since=None, until=None, filters=None,
+               reconnect=True):
+        """Stream the events of the daemon.
+
+        Parameters:
+            since (int, datetime): replay events since this time
+            until (int, datetime): stop streaming at this time
+            filters (dict): server side filters,
+                            for example ``{'event': ['start', 'die']}``
+            reconnect (bool): reconnect from the last seen event when the
+                              connection is lost
+        Returns:
+            EventStream: async iterator of events
+        """
+        return EventStream(self.api,
+                           since=since,
+                           until=until,
+                           filters=filters,
+                           reconnect=reconnect)
+
+    __call__ = stream
+
+    @task
+    def items(self, *, since, until, filters=None):
+        """List past events.
+
+        Parameters:
+            since (int, datetime): lower bound
+            until (int, datetime): upper bound
+            filters (dict): server side filters
+        Returns:
+            list: the events
+        """
+        stream = self.stream(since=since, until=until,
+                             filters=filters, reconnect=False)
+        results = []
+        while True:
+            data = yield from stream.read()
+            if data is None:
+                break
+            results.append(data)
+        return results
+
+
+class EventStream(AsyncIterator):
+    """
+    Events of the daemon, decoded as they arrive.
+
+    When the connection is lost, it reconnects with ``since`` set to the
+    time of the last seen event. Events of that second already delivered
+    are not delivered twice.
+    """
+
+    def __init__(self, api, *, since=None, until=None, filters=None,
+                 reconnect=True, delay=1):
+        self.api = api
+        self.since = to_timestamp(since)
+        self.until = to_timestamp(until)
+        self.filters = filters
+        self.reconnect = reconnect
+        self.delay = delay
+        self.closed = False
+        self._stream = None
+        self._seen = set()
+
+    @asyncio.coroutine
+    def read(self):
+        """
+        Returns:
+            dict: the next event, None when the stream is over
+        """
+        while not self.closed:
+            try:
+                if self._stream is None:
+                    self._stream = yield from self._connect()
+                event = yield from self._stream.read()
+            except (aiohttp.ClientError, OSError, ValueError) as error:
+                if not self.reconnect:
+                    self.close()
+                    raise
+                log.warn('events stream broken %s', error)
+                event = None
+
+            if event is None:
+                self._disconnect()
+                if not self.reconnect or self.over:
+                    self.close()
+                else:
+                    yield from asyncio.sleep(self.delay)
+                continue
+
+            if self._duplicate(event):
+                continue
+            return event
+
+    @property
+    def over(self):
+        return self.until is not None and self.until <= time.time()
+
+    @asyncio.coroutine
+    def _connect(self):
+        path = '/events'
+        params = {
+            'since': self.since,
+            'until': self.until,
+            'filters': self.filters,
+        }
+        response = yield from self.api.get(path, params=params, stream=True)
+        if response.status == 200:
+            return JSONStream(response)
+
+        data = yield from response.text()
+        self.close()
+        if response.status == 400:
+            raise ValidationError(data)
+        elif response.status == 500:
+            raise ServerError(data)
+        raise UnexpectedError(response.status, data)
+
+    def _duplicate(self, event):
+        moment = event.get('time')
+        if moment is None:
+            return False
+        key = (event.get('timeNano'), event.get('id'), event.get('status'))
+        if self.since is None or moment > self.since:
+            self.since = moment
+            self._seen = {key}
+            return False
+        if key in self._seen:
+            return True
+        self._seen.add(key)
+        return False
+
+    def _disconnect(self):
+        if self._stream is not None:
+            self._stream.close()
+            self._stream = None
+
+    def close(self):
+        self.closed = True
+        self._disconnect()
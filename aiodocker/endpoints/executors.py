@@ -1,13 +1,20 @@
-from aiodocker.util import task
+from aiodocker.util import AsyncIterator, task, as_completed_bounded
 from aiodocker.exceptions import NotFound
 from aiodocker.exceptions import ServerError, UnexpectedError
+from aiodocker.exceptions import ValidationError
 from aiodocker.formatters import from_exec_inspect
-from aiodocker.helpers import stream_raw
+from aiodocker.helpers import STDOUT, STDERR, stream_raw
+from collections import namedtuple
+from functools import partial
+import asyncio
 import json
 import logging
 
 log = logging.getLogger(__name__)
 
+#: stdout and stderr are None unless collected
+ExecResult = namedtuple('ExecResult', 'exit_code stdout stderr truncated')
+
 
 class ExecEndpoint:
 
@@ -43,12 +50,69 @@ class ExecEndpoint:
             raise ServerError(data)
         raise UnexpectedError(response.status, data)
 
+    def run(self, ref, cmd):
+        """Run a command in a container.
+
+        Returns:
+            ExecRun: async iterator of (stream id, memoryview)
+        """
+        return ExecRun(self, ref, cmd)
+
+    def run_many(self, refs, cmd, *, concurrency=10, timeout=None,
+                 limit=65536):
+        """Run a command in many containers.
+
+        Parameters:
+            refs (iterable): container ids or names
+            cmd (list): the command
+            concurrency (int): maximum of commands running at once
+            timeout (float): seconds allowed to every container, from
+                             create to inspect
+            limit (int): maximum of output bytes kept per stream
+        Returns:
+            Completed: async iterator of (ref, ExecResult or exception),
+                       as soon as every command is over. closing it
+                       cancels the commands not over yet
+        """
+        refs = list(refs)
+        calls = [partial(self._collect, ref, cmd, limit) for ref in refs]
+        return as_completed_bounded(calls, concurrency=concurrency,
+                                    timeout=timeout, keys=refs)
+
+    @asyncio.coroutine
+    def _collect(self, ref, cmd, limit):
+        run = self.run(ref, cmd)
+        try:
+            return (yield from run.collect(limit))
+        finally:
+            run.close()
+
     @task
     def start(self, exec_id):
+        stream = yield from self.open(exec_id)
+        while True:
+            frame = yield from stream.read_text()
+            if frame is None:
+                break
+            log.debug('%s: %s', *frame)
+        return
+
+    @asyncio.coroutine
+    def open(self, exec_id, *, tty=None):
+        """Start an exec instance.
+
+        Parameters:
+            tty (bool): the exec instance has a tty. None means inspect it
+        Returns:
+            RawStream: the output of the command, as it arrives
+        """
         path = '/exec/%s/start' % exec_id
+        if tty is None:
+            data = yield from self.inspect(exec_id)
+            tty = bool((data.get('process_config') or {}).get('tty'))
         data = {
             'Detach': False,
-            'Tty': False
+            'Tty': tty
         }
         headers = {
             'Content-Type': 'application/json'
@@ -56,12 +120,11 @@ class ExecEndpoint:
 
         response = yield from self.api.post(path,
                                             headers=headers,
-                                            data=json.dumps(data))
+                                            data=json.dumps(data),
+                                            stream=True)
 
         if response.status in (200, 201):
-            for data in (yield from stream_raw(response)):
-                log.info(data)
-            return
+            return stream_raw(response, tty=tty)
         data = yield from response.text()
         if response.status == 404:
             raise NotFound(data)
@@ -85,6 +148,7 @@ class ExecEndpoint:
                                             data=json.dumps(data))
 
         if response.status == 204:
+            yield from response.release()
             return True
         data = yield from response.text()
         if response.status == 404:
@@ -108,3 +172,101 @@ class ExecEndpoint:
         elif response.status == 500:
             raise ServerError(data)
         raise UnexpectedError(response.status, data)
+
+
+class ExecRun(AsyncIterator):
+    """
+    Output of a command ran in a container.
+
+    The exec instance is created and started by the first read. Once the
+    output is read, :meth:`result` tells the exit code::
+
+        run = client.executors.run(ref, ['echo', 'foo'])
+        frame = yield from run.read()
+        result = yield from run.result()
+
+    Or :meth:`collect` keeps the output into bytes::
+
+        result = yield from client.executors.run(ref, cmd).collect()
+    """
+
+    def __init__(self, endpoint, ref, cmd):
+        self.endpoint = endpoint
+        self.ref = ref
+        self.cmd = cmd
+        self.exec_id = None
+        self.closed = False
+        self._stream = None
+
+    @asyncio.coroutine
+    def read(self):
+        """
+        Returns:
+            tuple: (stream id, memoryview), None once the command is over
+        """
+        if self.closed:
+            return None
+        if self._stream is None:
+            self.exec_id = yield from self.endpoint.create(self.ref,
+                                                           cmd=self.cmd)
+            # created without tty
+            self._stream = yield from self.endpoint.open(self.exec_id,
+                                                         tty=False)
+        frame = yield from self._stream.read()
+        if frame is None:
+            self.close()
+        return frame
+
+    @asyncio.coroutine
+    def result(self):
+        """
+        Waits for the end of the command, the output not read yet is
+        discarded.
+
+        Returns:
+            ExecResult: without output
+        Raises:
+            ValidationError: closed before the command was started
+        """
+        while (yield from self.read()) is not None:
+            pass
+        if self.exec_id is None:
+            raise ValidationError('closed before the command was started')
+        data = yield from self.endpoint.inspect(self.exec_id)
+        return ExecResult(data['exit_code'], None, None, False)
+
+    @asyncio.coroutine
+    def collect(self, limit=65536):
+        """
+        Waits for the end of the command, and keeps its output.
+
+        Parameters:
+            limit (int): maximum of bytes kept per stream, the remaining
+                         output is discarded
+        Returns:
+            ExecResult: with stdout and stderr bytes. truncated tells if
+                        some output was discarded
+        """
+        buffers = {STDOUT: bytearray(), STDERR: bytearray()}
+        truncated = False
+        while True:
+            frame = yield from self.read()
+            if frame is None:
+                break
+            stream, data = frame
+            buffer = buffers.get(stream)
+            if buffer is None:
+                continue
+            room = limit - len(buffer)
+            if len(data) > room:
+                truncated, data = True, data[:room]
+            buffer += data
+        result = yield from self.result()
+        return result._replace(stdout=bytes(buffers[STDOUT]),
+                               stderr=bytes(buffers[STDERR]),
+                               truncated=truncated)
+
+    def close(self):
+        self.closed = True
+        if self._stream is not None:
+            self._stream.close()
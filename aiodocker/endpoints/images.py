@@ -1,9 +1,10 @@
+from aiodocker.cache import cached, invalidate
 from aiodocker.util import task
 from aiodocker.exceptions import NotFound, ConflictError, BuildError
 from aiodocker.exceptions import ServerError, UnexpectedError
 from aiodocker.exceptions import ValidationError, CreateError
 from aiodocker.formatters import from_images, from_history
-from aiodocker.helpers import stream_raw_json
+from aiodocker.helpers import copy_stream, file_sender, stream_raw_json
 from aiodocker.util import parse_name, make_dockerfile, tar_reader
 import io
 import json
@@ -19,6 +20,7 @@ class ImagesEndpoint:
         self.api = client
 
     @task
+    @cached('images.items')
     def items(self, *, status=None):
         path = '/images/json'
         params = {
@@ -62,19 +64,26 @@ class ImagesEndpoint:
                                             params=params,
                                             headers=headers,
                                             data=data,
-                                            chunked=512)
+                                            chunked=512,
+                                            stream=True)
         if response.status == 200:
             image_id = None
             PATTERN = re.compile('Successfully built (?P<image_id>[0-9a-f]+)')
-            for data in (yield from stream_raw_json(response)):
+            stream = stream_raw_json(response)
+            while True:
+                data = yield from stream.read()
+                if data is None:
+                    break
                 log.info(data)
                 if 'error' in data:
+                    stream.close()
                     raise BuildError(data)
                 if 'stream' in data:
                     data = data['stream']
                     match = PATTERN.search(data)
                     if match:
                         image_id = match.group('image_id')
+            invalidate(self.api, 'image', name, image_id)
             return image_id
 
         data = yield from response.text()
@@ -83,6 +92,7 @@ class ImagesEndpoint:
         raise UnexpectedError(response.status, data)
 
     @task
+    @cached('images.inspect')
     def inspect(self, ref):
         path = '/images/%s/json' % ref
 
@@ -99,6 +109,7 @@ class ImagesEndpoint:
         raise UnexpectedError(response.status, data)
 
     @task
+    @cached('images.history')
     def history(self, ref):
         path = '/images/%s/history' % ref
 
@@ -138,6 +149,8 @@ class ImagesEndpoint:
 
         response = yield from self.api.post(path, params=params)
         if response.status == 201:
+            yield from response.release()
+            invalidate(self.api, 'image', ref, '%s:%s' % (repository, tag))
             return True
 
         data = yield from response.text()
@@ -165,8 +178,11 @@ class ImagesEndpoint:
 
         response = yield from self.api.delete(path, params=params)
         if response.status == 200:
+            yield from response.release()
+            invalidate(self.api, 'image', ref)
             return True
         elif response.status == 404:
+            yield from response.release()
             return False
 
         data = yield from response.text()
@@ -177,12 +193,17 @@ class ImagesEndpoint:
         raise UnexpectedError(response.status, data)
 
     @task
-    def export(self, ref, *, into=None):
+    def export(self, ref, *, into=None, chunk_size=4194304, progress=None):
         """Export an image.
 
+        Large chunks are written into the file by worker threads, while the
+        next ones are received.
+
         Parameters:
             ref (str): {repo}:{tag}
-            into (file): export into this file
+            into (file): export into this file, or file descriptor
+            chunk_size (int): maximum of bytes written at once
+            progress (callable): called with (bytes copied, bytes per second)
         Returns:
             file: a tar file object.
         """
@@ -191,19 +212,17 @@ class ImagesEndpoint:
             'names': ref
         }
 
-        file = into or io.BytesIO()
-        if isinstance(file, io.TextIOWrapper):
-            write = lambda x: file.write(x.decode('utf-8'))
-        else:
-            write = lambda x: file.write(x)
+        file = io.BytesIO() if into is None else into
 
-        response = yield from self.api.get(path, params=params)
+        response = yield from self.api.get(path, params=params,
+                                           stream=True)
         if response.status == 200:
-            content = response.content
-            chunk = yield from content.read(512)
-            while chunk:
-                write(chunk)
-                chunk = yield from content.read(512)
+            try:
+                yield from copy_stream(response, file,
+                                       chunk_size=chunk_size,
+                                       progress=progress)
+            finally:
+                response.close()
             return file
 
         data = yield from response.text()
@@ -214,11 +233,14 @@ class ImagesEndpoint:
         raise UnexpectedError(response.status, data)
 
     @task
-    def create_from_src(self, ref, *, src, tag=None):
+    def create_from_src(self, ref, *, src, tag=None, chunk_size=1048576):
         """Create an new image from a tar file.
 
+        The file is streamed, read by worker threads.
+
         Parameters:
             src (file): a file object
+            chunk_size (int): bytes sent at once
         """
 
         if tag and ':' in ref:
@@ -236,7 +258,7 @@ class ImagesEndpoint:
         headers = {}
 
         reader = yield from tar_reader(src)
-        data = reader.content
+        data = file_sender(reader.content, chunk_size=chunk_size)
         if reader.encoding:
             headers['Encoding'] = reader.encoding
 
@@ -247,14 +269,20 @@ class ImagesEndpoint:
                                             params=params,
                                             headers=headers,
                                             data=data,
-                                            chunked=512)
+                                            stream=True)
         if response.status == 200:
-            for data in (yield from stream_raw_json(response)):
+            stream = stream_raw_json(response)
+            while True:
+                data = yield from stream.read()
+                if data is None:
+                    break
                 log.info(data)
                 if 'error' in data:
+                    stream.close()
                     raise CreateError(data)
                 if 'stream' in data:
                     data = data['stream']
+            invalidate(self.api, 'image', '%s:%s' % (ref, tag or 'latest'))
             return True
 
         data = yield from response.text()
@@ -263,18 +291,22 @@ class ImagesEndpoint:
         raise UnexpectedError(response.status, data)
 
     @task
-    def load(self, src):
+    def load(self, src, *, chunk_size=1048576):
         """Load exported images from tarfile.
 
+        The file is streamed, read by worker threads. The messages of the
+        daemon are decoded as they arrive.
+
         Parameters:
             src (file): a file object
+            chunk_size (int): bytes sent at once
         """
 
         path = '/images/load'
         headers = {}
 
         reader = yield from tar_reader(src)
-        data = reader.content
+        data = file_sender(reader.content, chunk_size=chunk_size)
         if reader.encoding:
             headers['Encoding'] = reader.encoding
 
@@ -284,8 +316,22 @@ class ImagesEndpoint:
         response = yield from self.api.post(path,
                                             headers=headers,
                                             data=data,
-                                            chunked=512)
+                                            stream=True)
         if response.status == 200:
+            # newer daemons report the progress
+            stream = stream_raw_json(response)
+            try:
+                while True:
+                    data = yield from stream.read()
+                    if data is None:
+                        break
+                    log.debug(data)
+                    if 'error' in data:
+                        raise CreateError(data)
+            finally:
+                stream.close()
+            # the loaded images are not named, drop every image entry
+            invalidate(self.api, 'image', 'images.inspect', 'images.history')
             return True
 
         data = yield from response.text()
@@ -1,3 +1,4 @@
+from aiodocker.cache import cached
 from aiodocker.util import task
 from aiodocker.exceptions import UnexpectedError
 from aiodocker.formatters import from_info, from_version
@@ -12,6 +13,7 @@ class MiscEndpoint:
         self.api = client
 
     @task
+    @cached('misc.info')
     def info(self):
         response = yield from self.api.get('info')
         if response.status == 200:
@@ -21,6 +23,7 @@ class MiscEndpoint:
         raise UnexpectedError(response.status, data)
 
     @task
+    @cached('misc.version')
     def version(self):
         response = yield from self.api.get('version')
         if response.status == 200:
@@ -38,4 +41,5 @@ class MiscEndpoint:
             bool: True if it's ok
         """
         response = yield from self.api.get('_ping')
+        yield from response.release()
         return response.status == 200
@@ -40,9 +40,14 @@ class RegistryEndpoint:
         if tag:
             params['tag'] = tag
 
-        response = yield from self.api.post(path, params=params)
+        response = yield from self.api.post(path, params=params,
+                                            stream=True)
         if response.status == 200:
-            for data in (yield from stream_json(response)):
+            stream = stream_json(response)
+            while True:
+                data = yield from stream.read()
+                if data is None:
+                    break
                 log.info(data)
             return True
 
@@ -76,9 +81,17 @@ class RegistryEndpoint:
         else:
             path = '/images/%s/push' % image
 
-        response = yield from self.api.post(path, params=params)
+        response = yield from self.api.post(path, params=params,
+                                            stream=True)
         if response.status == 200:
-            data = yield from response.json()
+            # progress is streamed, the last message is the outcome
+            stream, data = stream_json(response), None
+            while True:
+                message = yield from stream.read()
+                if message is None:
+                    break
+                log.info(message)
+                data = message
             return data
 
         data = yield from response.text()
@@ -112,6 +125,7 @@ class RegistryEndpoint:
 
         response = yield from self.api.post(path, params=params)
         if response.status == 201:
+            yield from response.release()
             return True
 
         data = yield from response.text()
@@ -45,3 +45,13 @@ class CompareError(ValueError):
 class SparseError(ValueError):
     """Raised when comparing sparse objects"""
     pass
+
+
+class AmbiguousError(ValueError):
+    """Raised when a prefix matches several objects"""
+    pass
+
+
+class UnavailableError(Exception):
+    """Raised when no daemon is available"""
+    pass
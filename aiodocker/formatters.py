@@ -520,6 +520,7 @@ from_container.fields = yield_fields([
     Field('command', ('Command', 'Cmd'), None),
     Field('created', ('Created',), from_unixtime),
     Field('names', ('Names',), None),
+    Field('labels', ('Labels',), None),
     Field('status', ('Status',), None),
     Field('ports', ('Ports',), from_ports),
     Field('size_rw', ('SizeRw',), None),
@@ -539,6 +540,7 @@ from_container_config.fields = yield_fields([
     Field('exposed_ports', ('ExposedPorts',), from_exposed_ports),
     Field('hostname', ('Hostname',), None),
     Field('image', ('Image',), None),
+    Field('labels', ('Labels',), None),
     Field('mac_address', ('MacAddress',), None),
     Field('memory', ('Memory',), None),
     Field('memory_swap', ('MemorySwap',), None),
@@ -644,6 +646,7 @@ from_host_config.fields = yield_fields([
 from_image.fields = yield_fields([
     Field('repo_tags', ('RepoTags',), None),
     Field('id', ('Id',), None),
+    Field('labels', ('Labels',), None),
     Field('created', ('Created',), from_unixtime),
     Field('size', ('Size',), None),
     Field('virtual_size', ('VirtualSize',), None),
@@ -660,6 +663,9 @@ from_image_inspect.fields = yield_fields([
 
 from_info.fields = yield_fields([
     Field('containers', ('Containers',), None),
+    Field('containers_running', ('ContainersRunning',), None),
+    Field('containers_paused', ('ContainersPaused',), None),
+    Field('containers_stopped', ('ContainersStopped',), None),
     Field('images', ('Images',), None),
     Field('driver', ('Driver',), None),
     Field('driver_status', ('DriverStatus',), None),
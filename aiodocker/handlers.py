@@ -1,27 +1,73 @@
 from aiodocker.util import task
-from urllib.parse import urlparse
+from urllib.parse import urlencode, urlparse
 import aiohttp
+import asyncio
 import json
 import logging
 import os.path
 import ssl
+import time
 
 __all__ = ['DockerHandler']
 
 log = logging.getLogger(__name__)
 
+#: oldest and newest api versions spoken by the client
+MIN_VERSION = '1.17'
+MAX_VERSION = '1.24'
 
-class DockerHandler:
 
-    def __init__(self, host, version, cert_path=None, tls_verify=None):
+class DockerHandler:
+    """
+    Talks to a docker daemon over one long-lived session.
+
+    Short request/response calls and long-lived streams (logs, stats,
+    build and pull outputs...) are routed to distinct pools, so followers
+    can never starve quick calls.
+
+    Parameters:
+        pool_size (int): maximum of simultaneous request/response
+                         connections to the daemon. None means unbounded
+        stream_pool_size (int): maximum of simultaneous streaming
+                                connections. None means unbounded
+        keepalive_timeout (float): seconds an idle connection is kept open
+        coalesce (bool): identical GET requests in flight at the same time
+                         share one response
+        cache (ResponseCache): serves read endpoints
+
+    When version is None, the api version is negotiated with the daemon
+    before the first request.
+    """
+
+    def __init__(self, host, version, cert_path=None, tls_verify=None, *,
+                 pool_size=None, stream_pool_size=None, keepalive_timeout=30,
+                 coalesce=False, cache=None):
         cert, cert_ca = search_certs(cert_path)
-        host, socket, connector = connect(host, tls_verify, cert, cert_ca)
+        address = host
+        host, socket, connector = connect(address, tls_verify, cert, cert_ca,
+                                          limit=pool_size,
+                                          keepalive_timeout=keepalive_timeout)
+        _, _, stream_connector = connect(address, tls_verify, cert, cert_ca,
+                                         limit=stream_pool_size,
+                                         keepalive_timeout=keepalive_timeout)
 
         self.host = host
         self.socket = socket
         self.connector = connector
+        self.session = aiohttp.ClientSession(connector=connector)
+        self.stream_connector = stream_connector
+        self.stream_session = aiohttp.ClientSession(connector=stream_connector)
+        self.pool_size = pool_size
+        self.stream_pool_size = stream_pool_size
+        self.keepalive_timeout = keepalive_timeout
+        self.coalesce = coalesce
+        self._inflight = {}
+        self.cache = cache
+        self.inflight = 0
+        self.latency = None
 
         self.version = version
+        self._negotiation = None
         self.cert_path = cert_path
         self.tls_verify = tls_verify
         self.cert = cert
@@ -52,16 +98,212 @@ class DockerHandler:
         return self.request('DELETE', path, **kwargs)
 
     @task
-    def request(self, method, path, **kwargs):
-        version = kwargs.pop('version', self.version)
+    def request(self, method, path, *, stream=False, **kwargs):
+        """
+        Parameters:
+            stream (bool): the response is a long-lived stream and must be
+                           served by the streaming pool
+        """
+        version = kwargs.pop('version', None) or self.version
+        if version is None:
+            version = yield from self.negotiate()
         url = '%s/v%s/%s' % (self.host, version, path.lstrip('/'))
         params = kwargs.get('params', {}).copy()
         kwargs['params'] = parameters(params)
-        kwargs.setdefault('connector', self.connector)
 
-        response = yield from aiohttp.request(method, url, **kwargs)
+        self.inflight += 1
+        try:
+            if self.coalesce and method == 'GET' and not stream \
+                    and set(kwargs) == {'params'}:
+                key = method, url, tuple(sorted(kwargs['params'].items()))
+                flight = self._inflight.get(key)
+                if flight is None:
+                    flight = self._single_flight(method, url, **kwargs)
+                    self._inflight[key] = flight
+                    flight.add_done_callback(
+                        lambda f: self._inflight.pop(key, None))
+                # shielded, so that a cancelled caller does not hurt others
+                response = yield from asyncio.shield(flight)
+                return response
+
+            session = self.stream_session if stream else self.session
+            started = time.monotonic()
+            response = yield from session.request(method, url, **kwargs)
+            if not stream:
+                self.observe(time.monotonic() - started)
+            return response
+        finally:
+            self.inflight -= 1
+
+    @asyncio.coroutine
+    def hijack(self, method, path, *, params=None):
+        """
+        Performs a request, then keeps its connection for a raw stream in
+        both directions, like attach does.
+
+        aiohttp cannot write into a connection once its request is sent,
+        so this connection is opened apart from the pools.
+
+        Returns:
+            HijackedResponse: the connection
+        """
+        version = self.version
+        if version is None:
+            version = yield from self.negotiate()
+        target = '/v%s/%s' % (version, path.lstrip('/'))
+        query = urlencode(parameters(params or {}), doseq=True)
+        if query:
+            target = '%s?%s' % (target, query)
+
+        parsed = urlparse(self.host)
+        if self.socket:
+            reader, writer = yield from asyncio.open_unix_connection(
+                self.socket)
+        else:
+            tls = parsed.scheme == 'https'
+            reader, writer = yield from asyncio.open_connection(
+                parsed.hostname,
+                parsed.port or (443 if tls else 80),
+                ssl=self.connector.ssl_context if tls else None)
+
+        head = '\r\n'.join([
+            '%s %s HTTP/1.1' % (method, target),
+            'Host: %s' % parsed.netloc,
+            'Content-Type: text/plain',
+            'Content-Length: 0',
+            'Connection: Upgrade',
+            'Upgrade: tcp',
+            '', ''])
+        try:
+            writer.write(head.encode('latin-1'))
+            line = yield from reader.readline()
+            try:
+                status = int(line.split()[1])
+            except (IndexError, ValueError):
+                raise aiohttp.ClientResponseError('bad status line %r' % line)
+            headers = {}
+            while True:
+                line = yield from reader.readline()
+                if not line.strip():
+                    break
+                name, _, value = line.decode('latin-1').partition(':')
+                headers[name.strip().lower()] = value.strip()
+        except Exception:
+            writer.close()
+            raise
+        return HijackedResponse(status, headers, reader, writer)
+
+    @asyncio.coroutine
+    def negotiate(self):
+        """
+        Agrees on an api version with the daemon, once.
+
+        Returns:
+            str: the newest version known by both sides
+        """
+        if self.version is not None:
+            return self.version
+        if self._negotiation is None:
+            self._negotiation = self._negotiate()
+        try:
+            return (yield from asyncio.shield(self._negotiation))
+        except Exception:
+            # let the next request try again
+            self._negotiation = None
+            raise
+
+    @task
+    def _negotiate(self):
+        response = yield from self.session.get('%s/version' % self.host)
+        if response.status == 200:
+            data = yield from response.json()
+            server = data.get('ApiVersion', MIN_VERSION)
+            version = min(server, MAX_VERSION, key=parse_version)
+        else:
+            yield from response.release()
+            log.warn('cannot negotiate api version, fallback to %s',
+                     MIN_VERSION)
+            version = MIN_VERSION
+        self.version = version
+        return version
+
+    @asyncio.coroutine
+    def supports(self, version):
+        """
+        Tells if the agreed api version is at least version.
+
+        Returns:
+            bool
+        """
+        current = yield from self.negotiate()
+        return parse_version(current) >= parse_version(version)
+
+    def observe(self, duration):
+        """
+        Updates :attr:`latency`, the moving average of the seconds spent
+        waiting for request/response calls.
+        """
+        if self.latency is None:
+            self.latency = duration
+        else:
+            self.latency += (duration - self.latency) * 0.2
+
+    @task
+    def _single_flight(self, method, url, **kwargs):
+        """
+        Performs the request shared by concurrent callers.
+
+        The payload is read before returning, so every caller can decode its
+        own copy with :meth:`json` or :meth:`text`. Decoded payloads are not
+        shared because formatters consume them.
+        """
+        started = time.monotonic()
+        response = yield from self.session.request(method, url, **kwargs)
+        self.observe(time.monotonic() - started)
+        yield from response.read()
         return response
 
+    def close(self):
+        """
+        Close the sessions and all of their pooled connections.
+        """
+        if self.cache is not None:
+            self.cache.close()
+        self.session.close()
+        self.stream_session.close()
+
+    @property
+    def closed(self):
+        return self.session.closed and self.stream_session.closed
+
+
+class HijackedResponse:
+    """
+    Response of :meth:`DockerHandler.hijack`. Once upgraded, content
+    reads from the connection and writer writes into it.
+    """
+
+    def __init__(self, status, headers, reader, writer):
+        self.status = status
+        self.headers = headers
+        self.content = reader
+        self.writer = writer
+
+    @asyncio.coroutine
+    def text(self):
+        length = self.headers.get('content-length')
+        try:
+            if length is not None:
+                data = yield from self.content.readexactly(int(length))
+            else:
+                data = yield from self.content.read()
+        finally:
+            self.close()
+        return data.decode('utf-8', 'replace')
+
+    def close(self):
+        self.writer.close()
+
 
 def parameters(data):
 
@@ -86,35 +328,49 @@ def parameters(data):
     return response
 
 
-def connect(host, tls_verify, cert, cert_ca):
+def parse_version(version):
+    """
+    >>> parse_version('1.17')
+    (1, 17)
+    """
+    return tuple(int(part) for part in version.split('.'))
+
+
+def connect(host, tls_verify, cert, cert_ca, **opts):
+    """
+    Parameters:
+        opts: forwarded to the connector (limit, keepalive_timeout...)
+    """
     parsed = urlparse(host)
     if parsed.scheme == 'unix':
-        return connect_unix(parsed.path)
+        return connect_unix(parsed.path, **opts)
     else:
-        return connect_tcp(host, tls_verify, cert, cert_ca)
+        return connect_tcp(host, tls_verify, cert, cert_ca, **opts)
 
 
-def connect_unix(path):
+def connect_unix(path, **opts):
     socket = path
-    connector = aiohttp.TCPConnector(path=path)
+    connector = aiohttp.UnixConnector(path, **opts)
     return 'http://127.0.0.1', socket, connector
 
 
-def connect_tcp(host, tls_verify, cert, cert_ca):
+def connect_tcp(host, tls_verify, cert, cert_ca, **opts):
     parsed = urlparse(host)
     scheme, hostname, port = parsed.scheme, parsed.hostname, parsed.port
 
     if scheme == 'tcp':
         scheme = 'https' if tls_verify else 'http'
 
-    connector = None
     if scheme == 'https':
         context = ssl.SSLContext(ssl.PROTOCOL_SSLv23)
         context.verify_mode = ssl.CERT_NONE
         if cert:
             context.load_cert_chain(*cert)
         connector = aiohttp.TCPConnector(verify_ssl=True,
-                                         ssl_context=context)
+                                         ssl_context=context,
+                                         **opts)
+    else:
+        connector = aiohttp.TCPConnector(**opts)
 
     host = '%s://%s%s' % (scheme, hostname, (':%s' % port if port else ''))
     return host, None, connector
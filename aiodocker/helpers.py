@@ -1,81 +1,590 @@
+from aiodocker.util import AsyncIterator, task
+from functools import partial
 import asyncio
+import codecs
+import io
 import json
+import os
+import re
+import socket
 import struct
+import time
+import zlib
 
+STDIN, STDOUT, STDERR = 0, 1, 2
 
-@asyncio.coroutine
-def stream_json(response):
-    # TODO find a way to do this better, because results can became really huge
-    results = []
-    if response.headers['Transfer-Encoding'] == 'chunked':
-        # this is a stream
-        stream = response.content
-        buff = ''
-        while not stream.at_eof():
-            buff += (yield from stream.read(1)).decode('utf-8')
-            try:
-                data = json.loads(buff)
-                results.append(data)
-            except ValueError:
+STREAMS = {STDIN: 'stdin', STDOUT: 'stdout', STDERR: 'stderr'}
+
+# statuses of the image events of daemons which do not send their type
+IMAGE_EVENTS = ('untag', 'delete', 'pull', 'push', 'tag', 'import', 'load')
+
+
+class JSONStream(AsyncIterator):
+    """
+    Decodes concatenated JSON documents of a response as soon as they are
+    complete.
+
+    Parameters:
+        response (ClientResponse): the streamed response
+        chunk_size (int): maximum of bytes read from the socket at once
+    """
+
+    decoder = json.JSONDecoder()
+    whitespaces = re.compile(r'\s*')
+
+    def __init__(self, response, *, chunk_size=65536):
+        self.response = response
+        self.chunk_size = chunk_size
+        self._text = codecs.getincrementaldecoder('utf-8')()
+        self._buffer = ''
+        self._pos = 0
+
+    @asyncio.coroutine
+    def read(self):
+        """
+        Returns:
+            object: the next document, None at the end of the stream
+        """
+        while True:
+            data = self._decode()
+            if data is not None:
+                return data
+            chunk = yield from self.response.content.read(self.chunk_size)
+            if not chunk:
+                self._buffer += self._text.decode(b'', final=True)
+                if self._buffer[self._pos:].strip():
+                    raise ValueError('truncated document %r'
+                                     % self._buffer[self._pos:])
+                return None
+            self._buffer = self._buffer[self._pos:] + self._text.decode(chunk)
+            self._pos = 0
+
+    def _decode(self):
+        buffer = self._buffer
+        pos = self._pos = self.whitespaces.match(buffer, self._pos).end()
+        if pos == len(buffer):
+            return None
+        try:
+            data, self._pos = self.decoder.raw_decode(buffer, pos)
+        except ValueError:
+            # incomplete document, wait for more data
+            return None
+        return data
+
+    def close(self):
+        self.response.close()
+
+
+class RawStream(AsyncIterator):
+    """
+    Demultiplexes the raw streams of docker (logs, attach, exec).
+
+    Every frame is prefixed by a 8 bytes header, which holds the stream id
+    and the size of the payload. Frames are read as ``(stream id,
+    memoryview)`` tuples; payloads are neither copied nor decoded, unless
+    :meth:`read_text` is used.
+
+    Parameters:
+        response (ClientResponse): the streamed response
+        tty (bool): the container has a tty. docker does not frame its
+                    output, everything is stdout
+        lines (bool): with tty, read line by line instead of by chunks,
+                      so that every frame holds one line of the logs
+        chunk_size (int): maximum of bytes read at once, with tty only
+    """
+
+    header = struct.Struct('>BxxxL')
+
+    def __init__(self, response, *, tty=False, lines=False,
+                 chunk_size=65536):
+        self.response = response
+        self.tty = tty
+        self.lines = lines
+        self.chunk_size = chunk_size
+
+    @asyncio.coroutine
+    def read(self):
+        """
+        Returns:
+            tuple: (stream id, memoryview), None at the end of the stream
+        """
+        content = self.response.content
+        if self.tty and self.lines:
+            data = yield from content.readline()
+            return (STDOUT, memoryview(data)) if data else None
+        elif self.tty:
+            data = yield from content.read(self.chunk_size)
+            return (STDOUT, memoryview(data)) if data else None
+
+        try:
+            header = yield from content.readexactly(self.header.size)
+        except asyncio.IncompleteReadError as error:
+            if error.partial:
+                raise ValueError('truncated frame header')
+            return None
+        stream, length = self.header.unpack(header)
+        data = yield from content.readexactly(length)
+        return stream, memoryview(data)
+
+    @asyncio.coroutine
+    def read_text(self, encoding='utf-8', errors='replace'):
+        """
+        Returns:
+            tuple: (stream name, str), None at the end of the stream
+        """
+        frame = yield from self.read()
+        if frame is None:
+            return None
+        stream, data = frame
+        return STREAMS.get(stream, 'N/A'), str(data, encoding, errors)
+
+    @asyncio.coroutine
+    def pipe(self, stdout=None, stderr=None, *, batch=65536):
+        """
+        Writes payloads into sinks until the end of the stream.
+
+        Frames written into files by worker threads are gathered while
+        the previous write is in flight, up to batch bytes.
+
+        Parameters:
+            stdout: a file descriptor, a file, a StreamWriter or anything
+                    with a write method (which may be a coroutine).
+                    payloads are decoded from utf-8 for text files without
+                    a binary buffer. None discards the stream
+            stderr: same as stdout
+            batch (int): maximum of bytes gathered for a worker thread
+        Returns:
+            dict: bytes written per stream id
+        """
+        sinks = {}
+        for stream, sink in ((STDOUT, stdout), (STDERR, stderr)):
+            if sink is None:
                 continue
-            else:
-                buff = ''
-    else:
-        data = yield from response.json()
-        results.append(data)
-    return results
+            write = writer(sink, decode=True)
+            if threaded(sink):
+                write = BatchWriter(write, size=batch)
+            sinks[stream] = write
+        written = {STDOUT: 0, STDERR: 0}
+        try:
+            while True:
+                frame = yield from self.read()
+                if frame is None:
+                    break
+                stream, data = frame
+                write = sinks.get(stream)
+                if write is not None:
+                    yield from write(data)
+                    written[stream] += len(data)
+            for write in sinks.values():
+                if isinstance(write, BatchWriter):
+                    yield from write.flush()
+        finally:
+            for write in sinks.values():
+                if isinstance(write, BatchWriter):
+                    write.close()
+        return written
 
+    def close(self):
+        self.response.close()
 
-@asyncio.coroutine
-def stream_raw(response):
-    # TODO find a way to do this better, because results can became really huge
-    results = []
-    content_type = response.headers['Content-Type']
-    content = response.content
-    while not content.at_eof():
-        header = yield from content.read(8)
-        if not header:
-            break
-        type, length = struct.unpack('>BxxxL', header)
-        data = yield from content.read(length)
-
-        name = {0: 'stdin', 1: 'stdout', 2: 'stderr'}.get(type, 'N/A')
-        if content_type == 'application/vnd.docker.raw-stream':
-            results.append({
-                'type': name,
-                'msg': str(data, 'utf-8')
-            })
-        elif content_type == 'application/json':
-            results.append({
-                'type': name,
-                'payload': json.loads(str(data, 'utf-8'))
-            })
+
+class AttachStream(RawStream):
+    """
+    Full duplex stream of an attached container.
+
+    Frames of stdout and stderr are read like with :class:`RawStream`,
+    while stdin is written with :meth:`write`. Both sides are flow
+    controlled: reading stops once the buffer of the connection is full,
+    and writing waits while the transport buffer is full.
+
+    Parameters:
+        response (HijackedResponse): the upgraded connection
+        tty (bool): the container has a tty
+    """
+
+    @asyncio.coroutine
+    def write(self, data):
+        """
+        Writes bytes, bytearray or memoryview into stdin, without copy.
+        """
+        writer = self.response.writer
+        writer.write(data)
+        yield from writer.drain()
+
+    def write_eof(self):
+        """
+        Closes stdin, the remaining output can still be read.
+        """
+        writer = self.response.writer
+        if writer.can_write_eof():
+            writer.write_eof()
+
+
+def writer(sink, *, decode=False):
+    """
+    Wraps sink into a coroutine function which writes bytes into it.
+
+    Files, file descriptors and blocking sockets are written by worker
+    threads, so that the loop is never blocked by them. In-memory files,
+    like BytesIO, are written inline.
+    """
+    if sink is None:
+        return None
+
+    loop = asyncio.get_event_loop()
+    blocking = blocking_writer(sink, decode=decode)
+    if blocking is not None and threaded(sink):
+        @asyncio.coroutine
+        def write(data):
+            yield from loop.run_in_executor(None, blocking, data)
+        return write
+    elif blocking is not None:
+        @asyncio.coroutine
+        def write(data):
+            blocking(data)
+        return write
+
+    if isinstance(sink, socket.socket):
+        @asyncio.coroutine
+        def write(data):
+            yield from loop.sock_sendall(sink, data)
+        return write
+
+    @asyncio.coroutine
+    def write(data):
+        result = sink.write(data)
+        if asyncio.iscoroutine(result) or isinstance(result, asyncio.Future):
+            yield from result
+        elif hasattr(sink, 'drain'):
+            yield from sink.drain()
+    return write
+
+
+def threaded(sink):
+    """
+    Tells if writing into sink may block, and is left to worker threads.
+
+    Returns:
+        bool: True for file descriptors, blocking sockets and files backed
+              by a file descriptor. False for in-memory files
+    """
+    if isinstance(sink, int):
+        return True
+    if isinstance(sink, socket.socket):
+        return sink.gettimeout() != 0
+    if isinstance(sink, io.IOBase):
+        try:
+            sink.fileno()
+        except (OSError, ValueError):
+            return False
+        return True
+    return False
+
+
+class BatchWriter:
+    """
+    Writes payloads through write, one call at a time. Payloads written
+    while the previous call is in flight are gathered into the next call,
+    so that small frames do not cost a worker thread each.
+
+    Parameters:
+        write (coroutine function): writes bytes
+        size (int): bytes gathered before waiting for the call in flight
+    """
+
+    def __init__(self, write, *, size=65536):
+        self.write = write
+        self.size = size
+        self._buffer = bytearray()
+        self._pending = None
+
+    @asyncio.coroutine
+    def __call__(self, data):
+        self._buffer += data
+        if self._pending is not None:
+            if not self._pending.done() and len(self._buffer) < self.size:
+                return
+            yield from self._wait()
+        # handed over, not copied
+        data, self._buffer = self._buffer, bytearray()
+        self._pending = task(self.write)(data)
+
+    @asyncio.coroutine
+    def flush(self):
+        """
+        Waits for every payload to be written.
+        """
+        if self._pending is not None:
+            yield from self._wait()
+        if self._buffer:
+            data, self._buffer = self._buffer, bytearray()
+            yield from self.write(data)
+
+    @asyncio.coroutine
+    def _wait(self):
+        pending, self._pending = self._pending, None
+        yield from asyncio.wait([pending])
+        # raises the error of the previous call
+        pending.result()
+
+    def close(self):
+        if self._pending is not None:
+            self._pending.cancel()
+
+
+def blocking_writer(sink, *, decode=False):
+    """
+    Wraps a file, a file descriptor or a blocking socket into a function
+    which writes bytes into it, and may block.
+
+    Bytes go into the binary buffer of text files, like sys.stdout.
+
+    Parameters:
+        decode (bool): text files without a buffer receive the bytes
+                       decoded from utf-8. otherwise they are refused
+    Returns:
+        callable: None for other sinks
+    Raises:
+        TypeError: sink is a text file which cannot receive bytes
+    """
+    if isinstance(sink, socket.socket):
+        # non-blocking sockets are written by the loop
+        return sink.sendall if sink.gettimeout() != 0 else None
+
+    if isinstance(sink, io.TextIOBase):
+        if hasattr(sink, 'buffer'):
+            # what is written as text must come first
+            sink.flush()
+            sink = sink.buffer
+        elif decode:
+            decoder = codecs.getincrementaldecoder('utf-8')('replace')
+
+            def write(data):
+                sink.write(decoder.decode(data))
+            return write
         else:
-            results.append({
-                'type': name,
-                'raw': str(data, 'utf-8')
-            })
-    return results
+            raise TypeError('cannot write bytes into text file %r' % sink)
+
+    if isinstance(sink, int):
+        def write(data):
+            data = memoryview(data)
+            while data:
+                data = data[os.write(sink, data):]
+        return write
+
+    if isinstance(sink, io.IOBase):
+        def write(data):
+            data = memoryview(data)
+            while data:
+                # raw files may write partially
+                written = sink.write(data)
+                data = data[len(data) if written is None else written:]
+        return write
+
+    return None
 
 
 @asyncio.coroutine
-def stream_raw_json(response):
-    # TODO find a way to do this better, because results can became really huge
-    results = []
-    if response.headers['Transfer-Encoding'] == 'chunked':
-        # this is a stream
-        stream = response.content
-        buff = ''
-        while not stream.at_eof():
-            buff += (yield from stream.read(1)).decode('utf-8')
+def copy_stream(response, sink, *, chunk_size=1048576, compress=False,
+                progress=None, depth=4):
+    """
+    Copies the body of response into sink, without holding it in memory.
+
+    Reading the response, compressing and writing overlap: chunks go
+    through a queue of depth chunks, so that reading waits for writing
+    once the queue is full. Chunks start at 64 KiB and double up to
+    chunk_size bytes. Compression and writes into files, file descriptors
+    or blocking sockets run in worker threads of the loop, so that the
+    loop is never blocked by them. zlib and os.write release the GIL
+    meanwhile.
+
+    Parameters:
+        response (ClientResponse): the streamed response
+        sink: a file descriptor, a file, a socket, a StreamWriter or
+              anything with a write method (which may be a coroutine)
+        chunk_size (int): maximum of bytes written at once
+        compress (bool): gzip the body
+        progress (callable): called with (bytes copied, bytes per second)
+                             after every chunk written
+        depth (int): maximum of chunks waiting to be written
+    Returns:
+        int: bytes read from the response
+    """
+    loop = asyncio.get_event_loop()
+    write = writer(sink)
+    compressor = None
+    if compress:
+        compressor = zlib.compressobj(6, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+
+    queue = asyncio.Queue(depth)
+    started = time.monotonic()
+    state = {'written': 0, 'error': None}
+
+    @asyncio.coroutine
+    def drain():
+        while True:
+            chunk = yield from queue.get()
+            if chunk is None:
+                break
+            if state['error'] is not None:
+                continue
             try:
-                data = json.loads(buff)
-                results.append(data)
-            except ValueError:
+                size = len(chunk)
+                if compressor is not None:
+                    chunk = yield from loop.run_in_executor(
+                        None, compressor.compress, chunk)
+                yield from write(chunk)
+            except asyncio.CancelledError:
+                raise
+            except Exception as error:
+                # keeps consuming, so that the reader is not stuck
+                state['error'] = error
                 continue
-            else:
-                buff = ''
-    else:
-        data = yield from response.json()
-        results.append(data)
-    return results
+            state['written'] += size
+            if progress is not None:
+                elapsed = time.monotonic() - started
+                progress(state['written'],
+                         state['written'] / elapsed if elapsed else None)
+        if state['error'] is not None:
+            raise state['error']
+        if compressor is not None:
+            chunk = yield from loop.run_in_executor(None, compressor.flush)
+            yield from write(chunk)
+
+    drainer = task(drain)()
+    content = response.content
+    size = min(65536, chunk_size)
+    copied = 0
+    buffer = bytearray()
+    try:
+        while state['error'] is None:
+            data = yield from content.read(size - len(buffer))
+            buffer += data
+            if data and len(buffer) < size:
+                continue
+            if buffer:
+                copied += len(buffer)
+                # handed over, not copied
+                yield from queue.put(buffer)
+                buffer = bytearray()
+                size = min(size * 2, chunk_size)
+            if not data:
+                break
+        yield from queue.put(None)
+        yield from drainer
+    finally:
+        if not drainer.done():
+            drainer.cancel()
+    return copied
+
+
+@asyncio.coroutine
+def file_sender(obj, *, chunk_size=1048576, depth=4):
+    """
+    Streams a file as the body of a request.
+
+    Chunks are read by worker threads, at most depth chunks ahead of the
+    connection, so that the loop never waits for the disk. Regular files
+    are read with os.pread, which releases the GIL.
+
+    Parameters:
+        obj: a file or a file descriptor
+        chunk_size (int): bytes read and sent at once
+        depth (int): maximum of chunks read ahead
+    Returns:
+        generator: to be given as data to aiohttp, which sends it chunked
+    """
+    loop = asyncio.get_event_loop()
+    read = blocking_reader(obj, chunk_size)
+    queue = asyncio.Queue(depth)
+
+    @task
+    def fill():
+        try:
+            while True:
+                chunk = yield from loop.run_in_executor(None, read)
+                yield from queue.put(chunk)
+                if not chunk:
+                    break
+        except asyncio.CancelledError:
+            raise
+        except Exception as error:
+            yield from queue.put(error)
+
+    filler = fill()
+    try:
+        while True:
+            chunk = yield from queue.get()
+            if isinstance(chunk, Exception):
+                raise chunk
+            if not chunk:
+                break
+            yield chunk
+    finally:
+        filler.cancel()
+
+
+def blocking_reader(obj, chunk_size):
+    """
+    Wraps a file or a file descriptor into a function which reads its next
+    chunk, and may block. The chunk is empty at the end of the file.
+    """
+    if isinstance(obj, int):
+        return partial(os.read, obj, chunk_size)
+
+    if isinstance(obj, io.TextIOWrapper):
+        # an instance provided by open('/file/name', 'r')
+        obj = obj.buffer
+
+    if isinstance(obj, (io.BufferedReader, io.FileIO)):
+        fd, offset = obj.fileno(), obj.tell()
+
+        def read():
+            nonlocal offset
+            chunk = os.pread(fd, chunk_size, offset)
+            offset += len(chunk)
+            return chunk
+        return read
+
+    return partial(obj.read, chunk_size)
+
+
+def to_timestamp(obj):
+    """
+    Converts a datetime into seconds since the epoch, as expected by the
+    since and until parameters. Other values are left as is.
+    """
+    if hasattr(obj, 'timestamp'):
+        return int(obj.timestamp())
+    return obj
+
+
+def event_kind(event):
+    """
+    Returns:
+        str: the type of event, like container or image
+    """
+    kind = event.get('Type')
+    if kind is None:
+        kind = 'image' if event.get('status') in IMAGE_EVENTS \
+            else 'container'
+    return kind
+
+
+def stream_json(response):
+    """
+    Returns:
+        JSONStream: the documents of response, as they arrive
+    """
+    return JSONStream(response)
+
+
+def stream_raw(response, *, tty=False, lines=False):
+    """
+    Returns:
+        RawStream: the demultiplexed frames of response
+    """
+    return RawStream(response, tty=tty, lines=lines)
+
+
+stream_raw_json = stream_json
@@ -0,0 +1,452 @@
+from aiodocker.exceptions import NotFound
+from aiodocker.util import AsyncIterator, task
+from array import array
+from collections import Counter, OrderedDict, namedtuple
+from datetime import date
+import aiohttp
+import asyncio
+import heapq
+import logging
+import re
+import time
+
+__all__ = ['LogRecord', 'LogCursor', 'LogMerge', 'LogRing',
+           'parse_record', 'parse_timestamp']
+
+log = logging.getLogger(__name__)
+
+#: timestamp is in nanoseconds since the epoch, stream is the stream id
+#: and payload a memoryview of the line
+LogRecord = namedtuple('LogRecord', 'timestamp stream payload')
+
+EPOCH = date(1970, 1, 1).toordinal()
+
+RFC3339 = re.compile(br'(\d{4})-(\d\d)-(\d\d)[Tt ](\d\d):(\d\d):(\d\d)'
+                     br'(?:\.(\d+))?(?:([Zz])|([+-])(\d\d):(\d\d))$')
+
+
+def parse_timestamp(value):
+    """
+    Converts a RFC3339 timestamp into nanoseconds since the epoch.
+
+    Docker writes them with a fixed layout, which is sliced instead of
+    going through datetime or dateutil. Other layouts are matched with a
+    regular expression.
+
+    >>> parse_timestamp('2015-08-21T09:50:16.123456789Z')
+    1440150616123456789
+    >>> parse_timestamp(b'2015-08-21T11:50:16.5+02:00')
+    1440150616500000000
+    """
+    if isinstance(value, str):
+        value = value.encode('ascii')
+    if len(value) == 30 and value[19:20] == b'.' and value[29:] == b'Z':
+        year, month, day = value[0:4], value[5:7], value[8:10]
+        hour, minute, second = value[11:13], value[14:16], value[17:19]
+        fraction, sign = value[20:29], None
+    else:
+        match = RFC3339.match(value)
+        if match is None:
+            raise ValueError('not a RFC3339 timestamp %r' % value)
+        (year, month, day, hour, minute, second,
+         fraction, _, sign, zone_hour, zone_minute) = match.groups()
+
+    days = date(int(year), int(month), int(day)).toordinal() - EPOCH
+    seconds = days * 86400 + int(hour) * 3600 + int(minute) * 60 + int(second)
+    if sign is not None:
+        offset = int(zone_hour) * 3600 + int(zone_minute) * 60
+        seconds += -offset if sign == b'+' else offset
+    nanos = int(fraction[:9].ljust(9, b'0')) if fraction else 0
+    return seconds * 1000000000 + nanos
+
+
+def parse_record(frame):
+    """
+    Splits a frame of logs requested with timestamps.
+
+    Parameters:
+        frame (tuple): (stream id, memoryview), as read from a RawStream
+    Returns:
+        LogRecord: payload is not copied
+    """
+    stream, data = frame
+    head = bytes(data[:40])
+    space = head.find(b' ')
+    if space < 0:
+        raise ValueError('log frame without timestamp %r' % head)
+    return LogRecord(parse_timestamp(head[:space]), stream, data[space + 1:])
+
+
+class LogCursor(AsyncIterator):
+    """
+    Followed logs of a container, parsed into records, which survives
+    connection losses.
+
+    The timestamp of the last delivered record is kept into :attr:`last`.
+    When the connection is lost, logs are requested again since that
+    second (api 1.19), or from the beginning with older daemons, and the
+    records replayed up to last are skipped. Records sharing the timestamp
+    last are told apart by their payload. The stream is over once it ends
+    while the container is not running.
+
+    A cursor can be resumed in another process by giving it last, every
+    record up to last is skipped then.
+
+    Parameters:
+        log (ContainerLog): the logs to follow
+        last (int): timestamp of the last record already delivered
+        reconnect (bool): reconnect when the connection is lost
+        delay (float): seconds between two connections
+        maxsize (int): maximum of frames read ahead of the consumer
+    """
+
+    def __init__(self, log, *, last=None, reconnect=True, delay=1,
+                 maxsize=64):
+        self.log = log
+        self.last = last
+        self.reconnect = reconnect
+        self.delay = delay
+        self.maxsize = maxsize
+        self.closed = False
+        self._stream = None
+        # payloads delivered with the timestamp last, None when unknown
+        self._delivered = None
+        # replayed records are skipped up to this timestamp
+        self._replay = None
+        self._pending = None
+
+    @asyncio.coroutine
+    def read(self):
+        """
+        Returns:
+            LogRecord: the next record, None when the logs are over
+        """
+        while not self.closed:
+            try:
+                if self._stream is None:
+                    self._stream = yield from self._connect()
+                frame = yield from self._stream.read()
+            except (aiohttp.ClientError, OSError, ValueError) as error:
+                if not self.reconnect:
+                    self.close()
+                    raise
+                log.warn('logs of %s broken %s', self.log.ref, error)
+                self._disconnect()
+                yield from asyncio.sleep(self.delay)
+                continue
+
+            if frame is None:
+                self._disconnect()
+                if not self.reconnect or not (yield from self._running()):
+                    self.close()
+                else:
+                    yield from asyncio.sleep(self.delay)
+                continue
+
+            record = parse_record(frame)
+            if self._replay is not None:
+                if self._replayed(record):
+                    continue
+                self._replay = None
+            if record.timestamp != self.last or self._delivered is None:
+                self._delivered = Counter()
+            # payloads are read-only views, hashed without copy
+            self._delivered[record.payload] += 1
+            self.last = record.timestamp
+            return record
+
+    def _replayed(self, record):
+        if record.timestamp < self._replay:
+            return True
+        if record.timestamp > self._replay:
+            return False
+        if self._pending is None:
+            return True
+        if self._pending[record.payload]:
+            self._pending[record.payload] -= 1
+            return True
+        return False
+
+    @asyncio.coroutine
+    def _connect(self):
+        self._replay = self.last
+        self._pending = None
+        if self._delivered is not None:
+            self._pending = Counter(self._delivered)
+        if self.last is None:
+            return self.log.follow(maxsize=self.maxsize)
+        logs = self.log.tail('all')
+        supported = yield from logs.api.supports('1.19')
+        since = self.last // 1000000000 if supported else None
+        return logs.follow(since=since, maxsize=self.maxsize)
+
+    @asyncio.coroutine
+    def _running(self):
+        from aiodocker.endpoints.containers import ContainersEndpoint
+        try:
+            data = yield from ContainersEndpoint(self.log.api).inspect(
+                self.log.ref)
+        except NotFound:
+            return False
+        except (aiohttp.ClientError, OSError) as error:
+            log.warn('cannot inspect %s %s', self.log.ref, error)
+            return True
+        return bool(data['state']['running'])
+
+    def _disconnect(self):
+        if self._stream is not None:
+            self._stream.close()
+            self._stream = None
+
+    def close(self):
+        self.closed = True
+        self._disconnect()
+
+
+class LogMerge(AsyncIterator):
+    """
+    Records of many cursors, merged by timestamp.
+
+    This is a k-way merge: the next record of every source is kept in a
+    heap, and the oldest one is delivered once every source has a record
+    in the heap. A source which has not delivered anything for its lag
+    seconds is not waited for anymore, until it delivers again, so one
+    quiet or slow container does not stall the others. Its late records
+    are still delivered, as soon as they arrive.
+
+    :attr:`watermark` is the timestamp of the last delivered record, and
+    :attr:`late` counts the records delivered with an older timestamp.
+
+    Parameters:
+        cursors (OrderedDict): LogCursor per container ref. records with
+                               the same timestamp are delivered in this
+                               order
+        lag (float): seconds a source is waited for
+        lags (dict): seconds per container ref, instead of lag
+        clock (callable): returns the current time in seconds
+    """
+
+    def __init__(self, cursors, *, lag=1, lags=None, clock=time.monotonic):
+        self.cursors = OrderedDict(cursors)
+        self.lag = lag
+        self.lags = dict(lags or {})
+        self.clock = clock
+        self.watermark = None
+        self.late = 0
+        self.errors = {}
+        self.closed = False
+        self._refs = list(self.cursors)
+        self._lags = [self.lags.get(ref, lag) for ref in self._refs]
+        self._live = set(range(len(self._refs)))
+        self._heads = []
+        self._headed = set()
+        self._fetches = {}
+        self._waiting = {}
+
+    @asyncio.coroutine
+    def read(self):
+        """
+        Returns:
+            tuple: (container ref, LogRecord), None when every source is
+                   over
+        """
+        while not self.closed:
+            now = self.clock()
+            for index in self._live - self._headed - set(self._fetches):
+                self._fetches[index] = self._fetch(index)
+                self._waiting.setdefault(index, now)
+            self._collect()
+
+            if not self._heads and not self._fetches:
+                self.close()
+                break
+
+            # sources which may still deliver an older record
+            awaited = [self._waiting[index] + self._lags[index]
+                       for index in self._fetches]
+            if self._heads and all(deadline <= now for deadline in awaited):
+                return self._pop()
+
+            timeout = None
+            if self._heads:
+                timeout = max(awaited) - now
+            yield from asyncio.wait(list(self._fetches.values()),
+                                    timeout=timeout,
+                                    return_when=asyncio.FIRST_COMPLETED)
+
+    @task
+    def _fetch(self, index):
+        return (yield from self.cursors[self._refs[index]].read())
+
+    def _collect(self):
+        for index, fetch in list(self._fetches.items()):
+            if not fetch.done():
+                continue
+            del self._fetches[index]
+            self._waiting.pop(index, None)
+            ref = self._refs[index]
+            try:
+                record = fetch.result()
+            except asyncio.CancelledError:
+                raise
+            except Exception as error:
+                log.warn('cannot follow logs of %s %s', ref, error)
+                self.errors[ref] = error
+                record = None
+            if record is None:
+                self._live.discard(index)
+            else:
+                heapq.heappush(self._heads, (record.timestamp, index, record))
+                self._headed.add(index)
+
+    def _pop(self):
+        timestamp, index, record = heapq.heappop(self._heads)
+        self._headed.discard(index)
+        if self.watermark is not None and timestamp < self.watermark:
+            self.late += 1
+        else:
+            self.watermark = timestamp
+        return self._refs[index], record
+
+    def close(self):
+        self.closed = True
+        for fetch in self._fetches.values():
+            fetch.cancel()
+        self._fetches.clear()
+        for cursor in self.cursors.values():
+            cursor.close()
+
+
+class LogRing:
+    """
+    Last records of a container, kept in a fixed amount of memory.
+
+    Payloads are copied into a bytearray allocated once, used as a ring.
+    Offsets, lengths, timestamps and streams of the records are kept into
+    arrays of lines items, also allocated once. The oldest records are
+    dropped as soon as one of the bounds is reached. A payload bigger than
+    the buffer is truncated to its end.
+
+    Records are read with :meth:`tail`, or sliced like ContainerLog::
+
+        ring = client.containers.log('foo').ring(lines=10000)
+        yield from ring.start()
+        ring[-100:]
+
+    Parameters:
+        log (ContainerLog): the logs to follow, None to feed manually
+        size (int): bytes of payload kept
+        lines (int): records kept
+    """
+
+    def __init__(self, log=None, *, size=1048576, lines=10000):
+        if size < 1 or lines < 1:
+            raise ValueError('size and lines must be positive')
+        self.log = log
+        self.size = size
+        self.lines = lines
+        self.buffer = bytearray(size)
+        self.offsets = array('L', [0]) * lines
+        self.lengths = array('L', [0]) * lines
+        self.timestamps = array('q', [0]) * lines
+        self.streams = bytearray(lines)
+        self.used = 0
+        self.follower = None
+        self._first = 0
+        self._count = 0
+        self._end = 0
+
+    @task
+    def start(self, *, maxsize=64):
+        """
+        Follows the logs of the container, starting with its tail.
+        """
+        if self.follower is None:
+            logs = self.log.tail(self.lines)
+            self.follower = self._follow(logs.cursor(maxsize=maxsize))
+        return True
+
+    @task
+    def _follow(self, cursor):
+        try:
+            while True:
+                record = yield from cursor.read()
+                if record is None:
+                    break
+                self.feed(record)
+        except asyncio.CancelledError:
+            raise
+        except Exception as error:
+            log.warn('ring stops following %s %s', self.log.ref, error)
+        finally:
+            cursor.close()
+            self.follower = None
+
+    def close(self):
+        if self.follower is not None:
+            self.follower.cancel()
+
+    def feed(self, record):
+        """
+        Appends a LogRecord, dropping the oldest ones when needed.
+        """
+        payload = record.payload[-self.size:]
+        length = len(payload)
+        while self._count and (self._count == self.lines or
+                               self.used + length > self.size):
+            self.used -= self.lengths[self._first]
+            self._first = (self._first + 1) % self.lines
+            self._count -= 1
+
+        slot = (self._first + self._count) % self.lines
+        start = self._end
+        head = min(length, self.size - start)
+        self.buffer[start:start + head] = payload[:head]
+        self.buffer[:length - head] = payload[head:]
+        self._end = (start + length) % self.size
+
+        self.offsets[slot] = start
+        self.lengths[slot] = length
+        self.timestamps[slot] = record.timestamp
+        self.streams[slot] = record.stream
+        self.used += length
+        self._count += 1
+
+    @property
+    def last(self):
+        """
+        Timestamp of the newest record, None when empty.
+        """
+        if not self._count:
+            return None
+        return self.timestamps[(self._first + self._count - 1) % self.lines]
+
+    def tail(self, count):
+        """
+        Returns:
+            list: the count newest records, oldest first
+        """
+        return self[-count:] if count else []
+
+    def __getitem__(self, item):
+        if isinstance(item, slice):
+            return [self._record(i) for i in range(*item.indices(len(self)))]
+        if item < 0:
+            item += len(self)
+        if not 0 <= item < len(self):
+            raise IndexError('record index out of range')
+        return self._record(item)
+
+    def _record(self, index):
+        slot = (self._first + index) % self.lines
+        start, length = self.offsets[slot], self.lengths[slot]
+        end = start + length
+        if end <= self.size:
+            payload = bytes(self.buffer[start:end])
+        else:
+            payload = bytes(self.buffer[start:] +
+                            self.buffer[:end - self.size])
+        return LogRecord(self.timestamps[slot], self.streams[slot], payload)
+
+    def __len__(self):
+        return self._count
@@ -0,0 +1,374 @@
+from aiodocker.cache import invalidate
+from aiodocker.exceptions import NotFound
+from aiodocker.helpers import event_kind
+from aiodocker.util import task, PrefixIndex
+from collections import defaultdict
+import asyncio
+import logging
+import time
+
+__all__ = ['StateMirror']
+
+log = logging.getLogger(__name__)
+
+RUNNING_EVENTS = ('start', 'restart', 'unpause')
+EXITED_EVENTS = ('die', 'stop')
+
+
+class StateMirror:
+    """
+    In-memory mirror of the containers and images of a daemon.
+
+    It is seeded once by listing containers and images, then kept up to date
+    by the events of the daemon. Lookups are answered locally::
+
+        mirror = StateMirror(client)
+        yield from mirror.start()
+        mirror.is_running('my-container')
+
+    Container records are the ones of :meth:`ContainersEndpoint.items`,
+    plus a ``state`` key, one of created, running, paused, restarting,
+    exited or dead.
+    """
+
+    def __init__(self, client):
+        self.client = client
+        self.seeded = False
+        self.follower = None
+        self._callbacks = []
+        self._images_refresh = None
+        self._reset()
+
+    def _reset(self):
+        self._containers = {}
+        self._index = PrefixIndex()
+        self._labels = defaultdict(set)
+        self._states = defaultdict(set)
+        self._images = {}
+        self._images_index = PrefixIndex()
+
+    @task
+    def start(self):
+        """
+        Seeds the mirror and follows the events.
+        """
+        since = int(time.time())
+        yield from self._seed()
+        self._watch(since)
+        return True
+
+    def close(self):
+        if self.follower is not None:
+            self.follower.cancel()
+            self.follower = None
+
+    def on_change(self, callback):
+        """
+        Registers callback(kind, action, old, new) called on every change.
+
+        kind is container or image, action is one of added, updated or
+        removed. old or new is None when the record was added or removed.
+        """
+        self._callbacks.append(callback)
+        return callback
+
+    # lookups
+
+    def container(self, ref):
+        """
+        Parameters:
+            ref (str): id, unique id prefix or name
+        Returns:
+            dict: the container record, None if unknown
+        Raises:
+            AmbiguousError: ref matches several containers
+        """
+        if ref in self._containers:
+            return self._containers[ref]
+        try:
+            return self._index.resolve(ref)
+        except NotFound:
+            return None
+
+    def containers(self, *, state=None, label=None):
+        """
+        Parameters:
+            state (str): one of created, running, paused, restarting,
+                         exited or dead
+            label (str, tuple): a label key, or a (key, value) pair
+        Returns:
+            list: the matching container records
+        """
+        idents = None
+        if state is not None:
+            idents = self._states.get(state, set())
+        if label is not None:
+            matches = self._labels.get(label, set())
+            idents = matches if idents is None else idents & matches
+        if idents is None:
+            return list(self._containers.values())
+        return [self._containers[ident] for ident in idents]
+
+    def is_running(self, ref):
+        container = self.container(ref)
+        return container is not None and container['state'] == 'running'
+
+    def image(self, ref):
+        """
+        Parameters:
+            ref (str): id, unique id prefix or repo tag
+        Returns:
+            dict: the image record, None if unknown
+        Raises:
+            AmbiguousError: ref matches several images
+        """
+        if ref in self._images:
+            return self._images[ref]
+        try:
+            return self._images_index.resolve(ref)
+        except NotFound:
+            return None
+
+    def images(self):
+        return list(self._images.values())
+
+    # consistency
+
+    @task
+    def check(self):
+        """
+        Compares the mirror with the daemon.
+
+        Returns:
+            list: (kind, id, mirrored state, actual state) of every
+                  divergence. empty list means consistent
+        """
+        containers = yield from self.client.containers.items(status='all')
+        images = yield from self.client.images.items()
+
+        actual = {c['id']: container_state(c) for c in containers}
+        mirrored = {i: c['state'] for i, c in self._containers.items()}
+        response = []
+        for ident in set(actual) | set(mirrored):
+            if actual.get(ident) != mirrored.get(ident):
+                response.append(('container', ident,
+                                 mirrored.get(ident), actual.get(ident)))
+        actual = {i['id'] for i in images}
+        for ident in actual ^ set(self._images):
+            response.append(('image', ident,
+                             ident in self._images, ident in actual))
+        return response
+
+    @task
+    def resync(self):
+        """
+        Seeds the mirror again from scratch, and follows the events again
+        if following them failed.
+        """
+        since = int(time.time())
+        yield from self._seed()
+        self._watch(since)
+        return True
+
+    # internals
+
+    @asyncio.coroutine
+    def _seed(self):
+        containers = yield from self.client.containers.items(status='all')
+        images = yield from self.client.images.items()
+        previous, previous_images = self._containers, self._images
+        self._reset()
+        for container in containers:
+            self._add_container(container)
+        for image in images:
+            self._add_image(image)
+        self.seeded = True
+
+        for ident in set(previous) | set(self._containers):
+            old, new = previous.get(ident), self._containers.get(ident)
+            if old != new:
+                self._notify('container', old, new)
+        for ident in set(previous_images) | set(self._images):
+            old, new = previous_images.get(ident), self._images.get(ident)
+            if old != new:
+                self._notify('image', old, new)
+
+    def _watch(self, since):
+        if self.follower is None or self.follower.done():
+            events = self.client.events.stream(since=since)
+            self.follower = self._follow(events)
+
+    @task
+    def _follow(self, events):
+        try:
+            while True:
+                event = yield from events.read()
+                if event is None:
+                    break
+                try:
+                    yield from self._apply(event)
+                except asyncio.CancelledError:
+                    raise
+                except Exception:
+                    log.exception('cannot apply %s', event)
+        except asyncio.CancelledError:
+            raise
+        except Exception as error:
+            # the mirror is stale until resync
+            log.warn('mirror stops following events %s', error)
+        finally:
+            events.close()
+            self.follower = None
+
+    @asyncio.coroutine
+    def _apply(self, event):
+        kind = event_kind(event)
+        status = event.get('status') or event.get('Action')
+        ident = event.get('id') or event.get('Actor', {}).get('ID')
+
+        if kind == 'image':
+            if self._images_refresh is None:
+                self._images_refresh = self._refresh_images()
+            return
+
+        if kind != 'container' or not ident:
+            return
+
+        old = self._containers.get(ident)
+        if status == 'destroy':
+            if old is not None:
+                self._remove_container(ident)
+                self._notify('container', old, None)
+            return
+
+        if old is None or status in ('create', 'rename'):
+            # the cache may not have seen the event yet
+            invalidate(self.client.api, 'container', ident)
+            try:
+                data = yield from self.client.containers.inspect(ident)
+            except NotFound:
+                return
+            new = from_inspect(data)
+        else:
+            new = dict(old)
+            if status in RUNNING_EVENTS:
+                new['state'] = 'running'
+            elif status in EXITED_EVENTS:
+                new['state'] = 'exited'
+            elif status == 'pause':
+                new['state'] = 'paused'
+
+        if new != old:
+            if old is not None:
+                self._remove_container(ident)
+            self._add_container(new)
+            self._notify('container', old, self._containers[ident])
+
+    @task
+    def _refresh_images(self):
+        invalidate(self.client.api, 'image')
+        try:
+            images = yield from self.client.images.items()
+        finally:
+            self._images_refresh = None
+        previous = self._images
+        self._images, self._images_index = {}, PrefixIndex()
+        for image in images:
+            self._add_image(image)
+        for ident in set(previous) | set(self._images):
+            old, new = previous.get(ident), self._images.get(ident)
+            if old != new:
+                self._notify('image', old, new)
+
+    def _add_container(self, container):
+        container = dict(container)
+        container.setdefault('state', container_state(container))
+        ident = container['id']
+        self._containers[ident] = container
+        self._index.add(container)
+        for key, value in (container.get('labels') or {}).items():
+            self._labels[key].add(ident)
+            self._labels[key, value].add(ident)
+        self._states[container['state']].add(ident)
+
+    def _remove_container(self, ident):
+        container = self._containers.pop(ident)
+        self._index.discard(container)
+        for key, value in (container.get('labels') or {}).items():
+            discard(self._labels, key, ident)
+            discard(self._labels, (key, value), ident)
+        discard(self._states, container['state'], ident)
+
+    def _add_image(self, image):
+        image = dict(image)
+        self._images[image['id']] = image
+        self._images_index.add(image)
+
+    def _notify(self, kind, old, new):
+        if old is None:
+            action = 'added'
+        elif new is None:
+            action = 'removed'
+        else:
+            action = 'updated'
+        for callback in self._callbacks:
+            try:
+                callback(kind, action, old, new)
+            except Exception:
+                log.exception('callback %r failed', callback)
+
+
+def discard(index, key, ident):
+    idents = index.get(key)
+    if idents is not None:
+        idents.discard(ident)
+        if not idents:
+            del index[key]
+
+
+def container_state(container):
+    """
+    Guess the state of a listed container from its status.
+
+    >>> container_state({'status': 'Up 2 hours (Paused)'})
+    'paused'
+    """
+    if isinstance(container.get('state'), str):
+        return container['state']
+    status = container.get('status') or ''
+    if status.startswith('Up'):
+        return 'paused' if '(Paused)' in status else 'running'
+    if status.startswith('Restarting'):
+        return 'restarting'
+    if status.startswith('Exited'):
+        return 'exited'
+    if status.startswith('Dead'):
+        return 'dead'
+    return 'created'
+
+
+def from_inspect(data):
+    """
+    Converts an inspected container into a mirror record.
+    """
+    state = data.get('state') or {}
+    config = data.get('config') or {}
+    if state.get('paused'):
+        current = 'paused'
+    elif state.get('restarting'):
+        current = 'restarting'
+    elif state.get('running'):
+        current = 'running'
+    elif state.get('finished_at') and state['finished_at'].year > 1:
+        current = 'exited'
+    else:
+        current = 'created'
+    return {
+        'id': data['id'],
+        'names': [data['name']] if data.get('name') else [],
+        'image': config.get('image'),
+        'command': config.get('cmd'),
+        'created': data.get('created'),
+        'labels': config.get('labels') or {},
+        'state': current,
+    }
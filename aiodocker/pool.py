@@ -0,0 +1,222 @@
+from aiodocker.client import Docker
+from aiodocker.exceptions import UnavailableError
+from aiodocker.util import task, gather_bounded
+from collections import OrderedDict
+import asyncio
+import logging
+
+__all__ = ['DockerPool']
+
+log = logging.getLogger(__name__)
+
+
+class DockerPool:
+    """
+    Many clients, one per daemon.
+
+    Daemons are health checked with ping, and their info is refreshed
+    at the same time. New containers are placed on the least loaded
+    healthy daemon, see :meth:`load`.
+
+    Parameters:
+        clients (list): Docker instances
+        check_interval (float): seconds between two health checks
+        timeout (float): seconds allowed to every health check
+    """
+
+    def __init__(self, clients, *, check_interval=10, timeout=5):
+        self.clients = list(clients)
+        self.check_interval = check_interval
+        self.timeout = timeout
+        self.healthy = set()
+        self.infos = {}
+        self._placed = {client: 0 for client in self.clients}
+        self._checker = None
+
+    @classmethod
+    def from_hosts(cls, hosts, *, check_interval=10, timeout=5, **opts):
+        """
+        Parameters:
+            hosts (list): daemon addresses
+            opts: forwarded to every Docker instance
+        """
+        clients = [Docker(host, **opts) for host in hosts]
+        return cls(clients, check_interval=check_interval, timeout=timeout)
+
+    @task
+    def start(self):
+        """
+        Checks every daemon, then keeps checking them periodically.
+        """
+        yield from self.check()
+        if self._checker is None:
+            self._checker = self._check_forever()
+        return self.healthy
+
+    def close(self):
+        if self._checker is not None:
+            self._checker.cancel()
+            self._checker = None
+        for client in self.clients:
+            client.close()
+
+    @task
+    def check(self):
+        """
+        Pings every daemon and refreshes their info.
+
+        Returns:
+            set: the healthy clients
+        """
+        calls = [lambda c=client: self._check(c) for client in self.clients]
+        results = yield from gather_bounded(calls,
+                                            concurrency=len(calls) or 1,
+                                            timeout=self.timeout)
+        for client, result in zip(self.clients, results):
+            if result is True:
+                self.healthy.add(client)
+            else:
+                if client in self.healthy:
+                    log.warn('%r is unhealthy %s', client, result)
+                self.healthy.discard(client)
+        return self.healthy
+
+    @asyncio.coroutine
+    def _check(self, client):
+        alive = yield from client.misc.ping()
+        if alive:
+            self.infos[client] = yield from client.misc.info()
+            self._placed[client] = 0
+        return alive
+
+    @task
+    def _check_forever(self):
+        while True:
+            yield from asyncio.sleep(self.check_interval)
+            try:
+                yield from self.check()
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                log.exception('health check failed')
+
+    def load(self, client):
+        """
+        Scores a daemon, lower is better.
+
+        The score is the number of running containers per cpu, including
+        containers placed since the last check, plus the requests in
+        flight per cpu, plus the average latency in tenths of seconds.
+        """
+        info = self.infos.get(client) or {}
+        ncpu = info.get('ncpu') or 1
+        running = info.get('containers_running')
+        if running is None:
+            running = info.get('containers') or 0
+        running += self._placed.get(client, 0)
+        latency = client.api.latency or 0
+        return (running + client.api.inflight) / ncpu + latency * 10
+
+    def choose(self, *, memory=None):
+        """
+        Returns the least loaded healthy client.
+
+        Parameters:
+            memory (int): bytes required, daemons with less memory are
+                          ignored
+        Raises:
+            UnavailableError: no daemon matches
+        """
+        candidates = [client for client in self.clients
+                      if client in self.healthy]
+        if memory:
+            candidates = [client for client in candidates
+                          if (self.infos[client].get('memory_total') or 0)
+                          >= memory]
+        if not candidates:
+            raise UnavailableError('no daemon available')
+        return min(candidates, key=self.load)
+
+    @task
+    def create(self, name, **config):
+        """
+        Creates a container on the least loaded daemon.
+
+        Returns:
+            tuple: (client, container id)
+        """
+        client = self.choose(memory=config.get('memory'))
+        self._placed[client] += 1
+        container_id = yield from client.containers.create(name, **config)
+        return client, container_id
+
+    @task
+    def run(self, name, **config):
+        """
+        Creates and starts a container on the least loaded daemon.
+
+        Returns:
+            tuple: (client, container id)
+        """
+        client, container_id = yield from self.create(name, **config)
+        yield from client.containers.start(container_id)
+        return client, container_id
+
+    @task
+    def fan_out(self, func, *, concurrency=None, timeout=None):
+        """
+        Calls func on every healthy client.
+
+        Parameters:
+            func (callable): takes a client, returns a coroutine
+            concurrency (int): maximum of simultaneous calls
+            timeout (float): seconds allowed to every call
+        Returns:
+            OrderedDict: result or exception per client
+        """
+        clients = [client for client in self.clients
+                   if client in self.healthy]
+        calls = [lambda c=client: func(c) for client in clients]
+        results = yield from gather_bounded(calls,
+                                            concurrency=concurrency or
+                                            len(calls) or 1,
+                                            timeout=timeout)
+        return OrderedDict(zip(clients, results))
+
+    @task
+    def containers(self, *, status=None):
+        """
+        Lists the containers of every healthy daemon.
+
+        Containers are tagged with the ``host`` of their daemon. Daemons
+        which failed are skipped.
+        """
+        results = yield from self.fan_out(
+            lambda client: client.containers.items(status=status))
+        return list(merge(results))
+
+    @task
+    def images(self):
+        """
+        Lists the images of every healthy daemon.
+
+        Images are tagged with the ``host`` of their daemon. Daemons
+        which failed are skipped.
+        """
+        results = yield from self.fan_out(
+            lambda client: client.images.items())
+        return list(merge(results))
+
+    def __repr__(self):
+        return '<DockerPool(%s)>' % ', '.join(client.api.host
+                                             for client in self.clients)
+
+
+def merge(results):
+    for client, result in results.items():
+        if isinstance(result, Exception):
+            log.warn('%r failed %s', client, result)
+            continue
+        for element in result:
+            element['host'] = client.api.host
+            yield element
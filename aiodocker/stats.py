@@ -0,0 +1,476 @@
+from aiodocker.exceptions import NotFound, ServerError, UnexpectedError
+from aiodocker.logs import parse_timestamp
+from aiodocker.util import AsyncIterator, task
+from collections import deque
+import asyncio
+import json
+import logging
+import time
+
+__all__ = ['StatsCollector', 'StatsStream', 'usage']
+
+log = logging.getLogger(__name__)
+
+#: columns of the arrays of StatsCollector
+COUNTERS = ('read', 'cpu_total', 'cpu_system', 'ncpu', 'memory_usage',
+            'memory_limit', 'rx_bytes', 'tx_bytes', 'blkio_read',
+            'blkio_write')
+(READ, CPU_TOTAL, CPU_SYSTEM, NCPU, MEMORY_USAGE, MEMORY_LIMIT,
+ RX_BYTES, TX_BYTES, BLKIO_READ, BLKIO_WRITE) = range(len(COUNTERS))
+
+
+class StatsStream(AsyncIterator):
+    """
+    Resource usage of a container, computed from the stats streamed by
+    docker.
+
+    Docker sends one document per line, about every second. With an
+    interval, lines received before the next sample is due are skipped
+    without being decoded. Samples are computed by :func:`usage` against
+    the previous decoded document.
+
+    Parameters:
+        api (DockerHandler): the handler
+        ref (str): the container
+        interval (float): minimum of seconds between two samples. None
+                          means every document
+        raw (bool): read the decoded documents instead of samples
+        clock (callable): returns the current time in seconds
+    """
+
+    def __init__(self, api, ref, *, interval=None, raw=False,
+                 clock=time.monotonic):
+        self.api = api
+        self.ref = ref
+        self.interval = interval
+        self.raw = raw
+        self.clock = clock
+        self.closed = False
+        self.skipped = 0
+        self._response = None
+        self._previous = None
+        self._due = None
+
+    @asyncio.coroutine
+    def read(self):
+        """
+        Returns:
+            dict: the next sample, None when the stream is over
+        """
+        if self.closed:
+            return None
+        if self._response is None:
+            self._response = yield from self._connect()
+        content = self._response.content
+        while True:
+            line = yield from content.readline()
+            if not line:
+                self.close()
+                return None
+            now = self.clock()
+            if self._due is not None and now < self._due:
+                self.skipped += 1
+                continue
+            if not line.strip():
+                continue
+            data = json.loads(line.decode('utf-8'))
+            if self.interval:
+                self._due = now + self.interval
+            if self.raw:
+                return data
+            sample = usage(data, self._previous)
+            self._previous = data
+            return sample
+
+    @asyncio.coroutine
+    def _connect(self):
+        path = '/containers/%s/stats' % self.ref
+        response = yield from self.api.get(path, stream=True)
+        if response.status == 200:
+            return response
+
+        data = yield from response.text()
+        self.closed = True
+        if response.status == 404:
+            raise NotFound(data)
+        elif response.status == 500:
+            raise ServerError(data)
+        raise UnexpectedError(response.status, data)
+
+    def close(self):
+        self.closed = True
+        if self._response is not None:
+            self._response.close()
+            self._response = None
+
+
+def usage(data, previous=None):
+    """
+    Computes the resource usage of a stats document.
+
+    CPU percent is relative to one cpu, like ``docker stats``. Rates are
+    in bytes per second. Without a previous document, rates are None and
+    CPU is computed against ``precpu_stats`` when the daemon sends them.
+
+    Parameters:
+        data (dict): a document of /containers/(id)/stats
+        previous (dict): the document received before
+    Returns:
+        dict: with read (nanoseconds since the epoch), cpu_percent,
+              memory_usage, memory_limit, memory_percent, rx_bytes,
+              tx_bytes, rx_rate, tx_rate, blkio_read, blkio_write,
+              blkio_read_rate and blkio_write_rate
+    """
+    read = parse_timestamp(data['read'])
+    memory = data.get('memory_stats') or {}
+    memory_usage = memory.get('usage') or 0
+    memory_limit = memory.get('limit') or 0
+    rx_bytes, tx_bytes = network_bytes(data)
+    blkio_read, blkio_write = blkio_bytes(data)
+    sample = {
+        'read': read,
+        'cpu_percent': None,
+        'memory_usage': memory_usage,
+        'memory_limit': memory_limit,
+        'memory_percent': (memory_usage * 100 / memory_limit
+                           if memory_limit else None),
+        'rx_bytes': rx_bytes,
+        'tx_bytes': tx_bytes,
+        'rx_rate': None,
+        'tx_rate': None,
+        'blkio_read': blkio_read,
+        'blkio_write': blkio_write,
+        'blkio_read_rate': None,
+        'blkio_write_rate': None,
+    }
+
+    if previous is None:
+        sample['cpu_percent'] = cpu_percent(data.get('cpu_stats'),
+                                            data.get('precpu_stats'))
+        return sample
+
+    sample['cpu_percent'] = cpu_percent(data.get('cpu_stats'),
+                                        previous.get('cpu_stats'))
+    elapsed = (read - parse_timestamp(previous['read'])) / 1000000000
+    if elapsed > 0:
+        rx, tx = network_bytes(previous)
+        sample['rx_rate'] = (rx_bytes - rx) / elapsed
+        sample['tx_rate'] = (tx_bytes - tx) / elapsed
+        reads, writes = blkio_bytes(previous)
+        sample['blkio_read_rate'] = (blkio_read - reads) / elapsed
+        sample['blkio_write_rate'] = (blkio_write - writes) / elapsed
+    return sample
+
+
+def cpu_percent(current, previous):
+    if not current or not previous:
+        return None
+    cpu_usage = current.get('cpu_usage') or {}
+    try:
+        cpu_delta = cpu_usage['total_usage'] - \
+            previous['cpu_usage']['total_usage']
+        system_delta = current['system_cpu_usage'] - \
+            previous['system_cpu_usage']
+    except (KeyError, TypeError):
+        return None
+    if system_delta <= 0 or cpu_delta < 0:
+        return None
+    ncpu = current.get('online_cpus') or \
+        len(cpu_usage.get('percpu_usage') or ()) or 1
+    return cpu_delta * ncpu * 100 / system_delta
+
+
+def network_bytes(data):
+    """
+    Returns:
+        tuple: received and transmitted bytes, of every interface
+    """
+    networks = data.get('networks')
+    if networks is None:
+        # before api 1.21
+        networks = {'eth0': data.get('network') or {}}
+    rx = sum(network.get('rx_bytes') or 0 for network in networks.values())
+    tx = sum(network.get('tx_bytes') or 0 for network in networks.values())
+    return rx, tx
+
+
+def blkio_bytes(data):
+    """
+    Returns:
+        tuple: read and written bytes, of every device
+    """
+    entries = (data.get('blkio_stats') or {}).get(
+        'io_service_bytes_recursive') or ()
+    read, write = 0, 0
+    for entry in entries:
+        op = (entry.get('op') or '').lower()
+        if op == 'read':
+            read += entry.get('value') or 0
+        elif op == 'write':
+            write += entry.get('value') or 0
+    return read, write
+
+
+def counters(data):
+    """
+    Returns:
+        tuple: the values of :data:`COUNTERS` of a stats document
+    """
+    cpu = data.get('cpu_stats') or {}
+    cpu_usage = cpu.get('cpu_usage') or {}
+    memory = data.get('memory_stats') or {}
+    ncpu = cpu.get('online_cpus') or \
+        len(cpu_usage.get('percpu_usage') or ()) or 1
+    return ((parse_timestamp(data['read']),
+             cpu_usage.get('total_usage'),
+             cpu.get('system_cpu_usage'),
+             ncpu,
+             memory.get('usage'),
+             memory.get('limit')) +
+            network_bytes(data) + blkio_bytes(data))
+
+
+def import_numpy():
+    try:
+        import numpy
+    except ImportError:
+        raise ImportError('StatsCollector requires numpy, '
+                          'install aiodocker[stats]') from None
+    return numpy
+
+
+class StatsCollector:
+    """
+    Latest resource usage of every running container of a daemon.
+
+    Counters of the two latest documents of every container are kept in
+    numpy arrays, one row per container, so that usage, percentiles and
+    top consumers are computed for all containers at once::
+
+        collector = StatsCollector(client, concurrency=200)
+        yield from collector.start()
+        collector.top('cpu_percent', 10)
+
+    At most concurrency stats streams are opened at once. When there are
+    more containers, a stream is closed after two documents, in favor of
+    the next container waiting for one.
+
+    numpy is an optional dependency, ``pip install aiodocker[stats]``.
+
+    Parameters:
+        client (Docker): the client
+        concurrency (int): maximum of simultaneous stats streams
+        interval (float): minimum of seconds between two documents of a
+                          container
+        refresh (float): seconds between two listings of the containers
+    """
+
+    def __init__(self, client, *, concurrency=100, interval=None,
+                 refresh=30):
+        self.numpy = import_numpy()
+        self.client = client
+        self.concurrency = concurrency
+        self.interval = interval
+        self.refresh = refresh
+        self.ids = []
+        self.current = self.numpy.full((16, len(COUNTERS)), self.numpy.nan)
+        self.previous = self.current.copy()
+        self._rows = {}
+        self._tracked = set()
+        self._pending = deque()
+        self._ready = asyncio.Event()
+        self._workers = []
+        self._refresher = None
+
+    @task
+    def start(self):
+        """
+        Lists the running containers and starts streaming their stats.
+        """
+        yield from self.update()
+        if self._refresher is None:
+            self._workers = [self._work() for i in range(self.concurrency)]
+            self._refresher = self._refresh_forever()
+        return True
+
+    def close(self):
+        for worker in self._workers:
+            worker.cancel()
+        if self._refresher is not None:
+            self._refresher.cancel()
+        self._workers, self._refresher = [], None
+
+    @task
+    def update(self):
+        """
+        Adds the new running containers and drops the others.
+        """
+        containers = yield from self.client.containers.items(
+            status='running')
+        running = {container['id'] for container in containers}
+        for ref in list(self._rows):
+            if ref not in running:
+                self.remove(ref)
+        for ref in running - self._tracked:
+            self.add(ref)
+        return len(self.ids)
+
+    def add(self, ref):
+        if ref not in self._rows:
+            np = self.numpy
+            row = len(self.ids)
+            if row == len(self.current):
+                grow = np.full(self.current.shape, np.nan)
+                self.current = np.concatenate((self.current, grow))
+                self.previous = np.concatenate((self.previous, grow))
+            self.current[row] = self.previous[row] = np.nan
+            self.ids.append(ref)
+            self._rows[ref] = row
+        if ref not in self._tracked:
+            self._tracked.add(ref)
+            self._pending.append(ref)
+            self._ready.set()
+
+    def remove(self, ref):
+        row = self._rows.pop(ref)
+        last = len(self.ids) - 1
+        if row != last:
+            # keep rows packed, the last container takes the free row
+            moved = self.ids[row] = self.ids[last]
+            self._rows[moved] = row
+            self.current[row] = self.current[last]
+            self.previous[row] = self.previous[last]
+        self.ids.pop()
+
+    def store(self, ref, data):
+        """
+        Stores the counters of a stats document.
+        """
+        row = self._rows[ref]
+        self.previous[row] = self.current[row]
+        self.current[row] = [self.numpy.nan if value is None else value
+                             for value in counters(data)]
+
+    @task
+    def _work(self):
+        while True:
+            while not self._pending:
+                self._ready.clear()
+                yield from self._ready.wait()
+            ref = self._pending.popleft()
+            if ref not in self._rows:
+                self._tracked.discard(ref)
+                continue
+            try:
+                yield from self._stream(ref)
+            except asyncio.CancelledError:
+                raise
+            except Exception as error:
+                log.warn('cannot stream stats of %s %s', ref, error)
+                # the next update will try again
+                self._tracked.discard(ref)
+
+    @asyncio.coroutine
+    def _stream(self, ref):
+        stream = self.client.containers.stats_stream(
+            ref, interval=self.interval, raw=True)
+        documents = 0
+        try:
+            while ref in self._rows:
+                data = yield from stream.read()
+                if data is None or ref not in self._rows:
+                    # over, or removed meanwhile
+                    break
+                self.store(ref, data)
+                documents += 1
+                if documents >= 2 and self._pending:
+                    # gives the stream to a waiting container
+                    self._pending.append(ref)
+                    return
+            self._tracked.discard(ref)
+        finally:
+            stream.close()
+
+    @task
+    def _refresh_forever(self):
+        while True:
+            yield from asyncio.sleep(self.refresh)
+            try:
+                yield from self.update()
+            except asyncio.CancelledError:
+                raise
+            except Exception as error:
+                log.warn('cannot list containers %s', error)
+
+    def snapshot(self):
+        """
+        Computes the usage of every container at once, like :func:`usage`.
+
+        Returns:
+            dict: the container ids, then one array per metric, with nan
+                  where unknown yet
+        """
+        np = self.numpy
+        count = len(self.ids)
+        current, previous = self.current[:count], self.previous[:count]
+        delta = current - previous
+        with np.errstate(divide='ignore', invalid='ignore'):
+            elapsed = delta[:, READ] / 1e9
+            elapsed[~(elapsed > 0)] = np.nan
+            system = delta[:, CPU_SYSTEM]
+            system[~(system > 0)] = np.nan
+            cpu = delta[:, CPU_TOTAL] * current[:, NCPU] * 100 / system
+            cpu[cpu < 0] = np.nan
+            limit = current[:, MEMORY_LIMIT]
+            memory_percent = current[:, MEMORY_USAGE] * 100 / limit
+            rates = delta[:, RX_BYTES:] / elapsed[:, None]
+        return {
+            'ids': list(self.ids),
+            'cpu_percent': cpu,
+            'memory_usage': current[:, MEMORY_USAGE].copy(),
+            'memory_limit': limit.copy(),
+            'memory_percent': memory_percent,
+            'rx_rate': rates[:, 0],
+            'tx_rate': rates[:, 1],
+            'blkio_read_rate': rates[:, 2],
+            'blkio_write_rate': rates[:, 3],
+        }
+
+    def percentiles(self, metric, q=(50, 90, 99)):
+        """
+        Parameters:
+            metric (str): one of the arrays of :meth:`snapshot`
+            q (tuple): the percentiles
+        Returns:
+            dict: value per percentile, ignoring unknown values
+        """
+        np = self.numpy
+        values = self.snapshot()[metric]
+        values = values[~np.isnan(values)]
+        if not len(values):
+            return {p: None for p in q}
+        return dict(zip(q, np.percentile(values, q).tolist()))
+
+    def top(self, metric, n=10):
+        """
+        Parameters:
+            metric (str): one of the arrays of :meth:`snapshot`
+            n (int): number of containers
+        Returns:
+            list: (container id, value) of the n biggest consumers,
+                  biggest first
+        """
+        np = self.numpy
+        snapshot = self.snapshot()
+        values = snapshot[metric]
+        values = np.where(np.isnan(values), -np.inf, values)
+        if n < len(values):
+            rows = np.argpartition(-values, n)[:n]
+        else:
+            rows = np.arange(len(values))
+        rows = rows[np.argsort(-values[rows], kind='stable')]
+        return [(snapshot['ids'][row], float(values[row]))
+                for row in rows if values[row] > -np.inf]
+
+    def __len__(self):
+        return len(self.ids)
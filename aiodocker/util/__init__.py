@@ -1,6 +1,8 @@
+from .archive import *  # noqa
 from .async import *  # noqa
 from .config import * # noqa
 from .files import *  # noqa
+from .index import *  # noqa
 from .names import *  # noqa
 
 
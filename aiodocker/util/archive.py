@@ -0,0 +1,192 @@
+from .async import AsyncIterator
+from tarfile import BLOCKSIZE, GNUTYPE_LONGLINK, GNUTYPE_LONGNAME
+from tarfile import SOLARIS_XHDTYPE, XGLTYPE, XHDTYPE, TarInfo
+import asyncio
+
+__all__ = ['TarStream', 'TarMember']
+
+NUL = b'\0' * BLOCKSIZE
+
+
+class TarStream(AsyncIterator):
+    """
+    Members of a tar archive, parsed as the archive is received.
+
+    The data of a member must be read before reading the next member,
+    otherwise it is skipped. GNU long names and links, and pax headers are
+    applied to the members.
+
+    Parameters:
+        response (ClientResponse): the streamed archive
+        encoding (str): encoding of the names
+    """
+
+    def __init__(self, response, *, encoding='utf-8'):
+        self.response = response
+        self.content = response.content
+        self.encoding = encoding
+        self.closed = False
+        self._member = None
+        self._globals = {}
+
+    @asyncio.coroutine
+    def read(self):
+        """
+        Returns:
+            TarMember: the next member, None at the end of the archive
+        """
+        if self._member is not None:
+            yield from self._member.skip()
+            self._member = None
+        long_name, long_link, pax = None, None, {}
+        while not self.closed:
+            block = yield from self._read(BLOCKSIZE, eof=True)
+            if not block or block == NUL:
+                self.close()
+                break
+            info = TarInfo.frombuf(block, self.encoding, 'surrogateescape')
+
+            if info.type in (GNUTYPE_LONGNAME, GNUTYPE_LONGLINK):
+                data = yield from self._data(info.size)
+                name = data.split(b'\0', 1)[0].decode(self.encoding,
+                                                      'surrogateescape')
+                if info.type == GNUTYPE_LONGNAME:
+                    long_name = name
+                else:
+                    long_link = name
+                continue
+
+            if info.type in (XHDTYPE, XGLTYPE, SOLARIS_XHDTYPE):
+                data = yield from self._data(info.size)
+                records = parse_pax(data)
+                if info.type == XGLTYPE:
+                    self._globals.update(records)
+                else:
+                    pax.update(records)
+                continue
+
+            if long_name is not None:
+                info.name = long_name
+            if long_link is not None:
+                info.linkname = long_link
+            apply_pax(info, dict(self._globals, **pax))
+            self._member = TarMember(self, info)
+            return self._member
+
+    @asyncio.coroutine
+    def _read(self, size, *, eof=False):
+        try:
+            return (yield from self.content.readexactly(size))
+        except asyncio.IncompleteReadError as error:
+            if eof and not error.partial:
+                return b''
+            raise ValueError('truncated archive')
+
+    @asyncio.coroutine
+    def _data(self, size):
+        data = yield from self._read(size)
+        yield from self._read(padding(size))
+        return data
+
+    def close(self):
+        self.closed = True
+        self.response.close()
+
+
+class TarMember:
+    """
+    A member of a :class:`TarStream`, its data is read from the archive.
+
+    Attributes:
+        info (TarInfo): the header
+        name (str): path of the member
+        size (int): bytes of data
+    """
+
+    def __init__(self, stream, info):
+        self.stream = stream
+        self.info = info
+        self.name = info.name
+        self.size = info.size if info.isreg() else 0
+        self.remaining = self.size
+        self._padding = padding(self.size)
+
+    @asyncio.coroutine
+    def read(self, n=-1):
+        """
+        Returns:
+            bytes: at most n bytes of data, every remaining byte when n is
+                   negative. empty at the end of the data
+        """
+        if not self.remaining:
+            yield from self._finish()
+            return b''
+        if n < 0:
+            data = yield from self.stream._read(self.remaining)
+        else:
+            data = yield from self.stream.content.read(min(n, self.remaining))
+            if not data:
+                raise ValueError('truncated archive')
+        self.remaining -= len(data)
+        if not self.remaining:
+            yield from self._finish()
+        return data
+
+    @asyncio.coroutine
+    def skip(self):
+        """
+        Discards the data not read yet.
+        """
+        while self.remaining:
+            yield from self.read(65536)
+        yield from self._finish()
+
+    @asyncio.coroutine
+    def _finish(self):
+        if self._padding:
+            padding, self._padding = self._padding, 0
+            yield from self.stream._read(padding)
+
+    def __repr__(self):
+        return '<TarMember(%r, %s bytes)>' % (self.name, self.size)
+
+
+def padding(size):
+    return -size % BLOCKSIZE
+
+
+def parse_pax(data):
+    """
+    >>> parse_pax(b'20 path=foo/bar.txt\\n')
+    {'path': 'foo/bar.txt'}
+    """
+    records, pos = {}, 0
+    while pos < len(data):
+        space = data.find(b' ', pos)
+        if space < 0:
+            break
+        length = int(data[pos:space])
+        if length <= 0:
+            raise ValueError('invalid pax header')
+        record = data[space + 1:pos + length - 1]
+        key, _, value = record.partition(b'=')
+        records[key.decode('utf-8')] = value.decode('utf-8',
+                                                    'surrogateescape')
+        pos += length
+    return records
+
+
+def apply_pax(info, records):
+    info.pax_headers = records
+    if 'path' in records:
+        info.name = records['path']
+    if 'linkpath' in records:
+        info.linkname = records['linkpath']
+    if 'uname' in records:
+        info.uname = records['uname']
+    if 'gname' in records:
+        info.gname = records['gname']
+    for key, convert in (('size', int), ('uid', int), ('gid', int),
+                         ('mtime', float)):
+        if key in records:
+            setattr(info, key, convert(records[key]))
@@ -3,6 +3,23 @@ import asyncio
 import inspect
 
 
+class AsyncIterator:
+    """
+    Consumed with ``yield from stream.read()``, which returns None once
+    exhausted, or with ``async for`` on python 3.5+.
+    """
+
+    def __aiter__(self):
+        return self
+
+    @asyncio.coroutine
+    def __anext__(self):
+        data = yield from self.read()
+        if data is None:
+            raise StopAsyncIteration
+        return data
+
+
 def task(func=None, *, loop=None):
     """Transforms func into an asyncio task."""
 
@@ -33,3 +50,109 @@ def mark_task(func):
     """Mark function as a defacto task (for documenting purpose)"""
     func._is_task = True
     return func
+
+
+@asyncio.coroutine
+def gather_bounded(calls, *, concurrency, timeout=None, loop=None):
+    """Runs calls, with at most concurrency of them at once.
+
+    Parameters:
+        calls (iterable): callables returning a coroutine or a future
+        concurrency (int): maximum of simultaneous calls
+        timeout (float): seconds allowed to every call
+    Returns:
+        list: the result or the exception of every call, in order
+    """
+    calls = list(calls)
+    results = [None] * len(calls)
+    pending = iter(enumerate(calls))
+
+    @asyncio.coroutine
+    def worker():
+        for i, call in pending:
+            try:
+                results[i] = yield from asyncio.wait_for(call(), timeout,
+                                                         loop=loop)
+            except asyncio.CancelledError:
+                raise
+            except Exception as error:
+                results[i] = error
+
+    workers = [worker() for i in range(min(concurrency, len(calls)))]
+    if workers:
+        yield from asyncio.gather(*workers, loop=loop)
+    return results
+
+
+def as_completed_bounded(calls, *, concurrency, timeout=None, keys=None,
+                         loop=None):
+    """Runs calls, with at most concurrency of them at once.
+
+    Unlike :func:`gather_bounded`, outcomes are read as soon as every call
+    finishes, and the calls not finished yet are cancelled by closing the
+    iterator.
+
+    Parameters:
+        calls (iterable): callables returning a coroutine or a future
+        concurrency (int): maximum of simultaneous calls
+        timeout (float): seconds allowed to every call
+        keys (iterable): identify every call, defaults to its position
+    Returns:
+        Completed: async iterator of (key, result or exception)
+    """
+    return Completed(calls, concurrency=concurrency, timeout=timeout,
+                     keys=keys, loop=loop)
+
+
+class Completed(AsyncIterator):
+    """
+    Outcomes of calls, in the order they finish.
+    """
+
+    def __init__(self, calls, *, concurrency, timeout=None, keys=None,
+                 loop=None):
+        calls = list(calls)
+        keys = range(len(calls)) if keys is None else list(keys)
+        self.concurrency = concurrency
+        self.timeout = timeout
+        self.loop = loop
+        self.remaining = len(calls)
+        self.closed = False
+        self._pending = iter(zip(keys, calls))
+        self._outcomes = asyncio.Queue(loop=loop)
+        self._workers = None
+
+    @asyncio.coroutine
+    def read(self):
+        """
+        Returns:
+            tuple: (key, result or exception), None once every call is done
+        """
+        if self.closed or not self.remaining:
+            return None
+        if self._workers is None:
+            count = min(self.concurrency, self.remaining)
+            self._workers = [self._work() for i in range(count)]
+        outcome = yield from self._outcomes.get()
+        self.remaining -= 1
+        return outcome
+
+    @task
+    def _work(self):
+        for key, call in self._pending:
+            try:
+                result = yield from asyncio.wait_for(call(), self.timeout,
+                                                     loop=self.loop)
+            except asyncio.CancelledError:
+                raise
+            except Exception as error:
+                result = error
+            self._outcomes.put_nowait((key, result))
+
+    def close(self):
+        """
+        Cancels the calls not finished yet.
+        """
+        self.closed = True
+        for worker in self._workers or ():
+            worker.cancel()
@@ -0,0 +1,110 @@
+from aiodocker.exceptions import AmbiguousError, NotFound
+from bisect import bisect_left, insort
+
+__all__ = ['PrefixIndex']
+
+
+class PrefixIndex:
+    """
+    Resolves containers or images by id, id prefix, name or repo tag.
+
+    Ids are kept sorted, so that a prefix is resolved with a bisection
+    instead of comparing every record. Like docker, names and repo tags
+    must match exactly.
+
+    Parameters:
+        records (list): as returned by from_containers or from_images
+    """
+
+    def __init__(self, records=()):
+        self._exact = {}
+        self._ids = []
+        self._records = {}
+        for record in records:
+            self._ids.extend(self._register(record))
+        self._ids.sort()
+
+    def resolve(self, ref):
+        """
+        Parameters:
+            ref (str): an id, an unique id prefix, a name or a repo tag
+        Returns:
+            dict: the matching record
+        Raises:
+            NotFound: nothing matches
+            AmbiguousError: the prefix matches several records
+        """
+        if ref in self._exact:
+            return self._exact[ref]
+
+        ident = ref[7:] if ref.startswith('sha256:') else ref
+        pos = bisect_left(self._ids, ident)
+        if pos == len(self._ids) or not self._ids[pos].startswith(ident):
+            raise NotFound('%r not found' % ref)
+        if pos + 1 < len(self._ids) \
+                and self._ids[pos + 1].startswith(ident):
+            raise AmbiguousError('%r matches %s and %s'
+                                 % (ref, self._ids[pos], self._ids[pos + 1]))
+        return self._records[self._ids[pos]]
+
+    def get(self, ref, default=None):
+        try:
+            return self.resolve(ref)
+        except (NotFound, AmbiguousError):
+            return default
+
+    def add(self, record):
+        for ident in self._register(record):
+            insort(self._ids, ident)
+
+    def discard(self, record):
+        for ident in record_ids(record):
+            if self._records.get(ident) is record:
+                del self._records[ident]
+                pos = bisect_left(self._ids, ident)
+                del self._ids[pos]
+        for alias in record_aliases(record):
+            if self._exact.get(alias) is record:
+                del self._exact[alias]
+
+    def _register(self, record):
+        idents = []
+        for ident in record_ids(record):
+            if ident not in self._records:
+                idents.append(ident)
+            self._records[ident] = record
+        for alias in record_aliases(record):
+            self._exact[alias] = record
+        return idents
+
+    def __contains__(self, ref):
+        return self.get(ref) is not None
+
+    def __len__(self):
+        return len(self._ids)
+
+
+def record_ids(record):
+    ident = record.get('id') or record.get('Id')
+    if ident:
+        if ident.startswith('sha256:'):
+            ident = ident[7:]
+        yield ident
+
+
+def record_aliases(record):
+    for ident in record_ids(record):
+        yield ident
+        yield 'sha256:%s' % ident
+    names = list(record.get('names') or [])
+    if record.get('name'):
+        names.append(record['name'])
+    for name in names:
+        yield name
+        yield name.lstrip('/')
+    for tag in record.get('repo_tags') or []:
+        if tag == '<none>:<none>':
+            continue
+        yield tag
+        if tag.endswith(':latest'):
+            yield tag[:-7]
@@ -31,10 +31,11 @@ setup(
         'Topic :: System :: Clustering',
     ],
     install_requires=[
-        'aiohttp>=0.15.1',
+        'aiohttp>=0.17',
         'python-dateutil>=2.4'
     ],
     extras_require={
         ':python_version=="3.3"': ['asyncio'],
+        'stats': ['numpy'],
     }
 )
@@ -4,6 +4,7 @@ import logging
 import os
 import os.path
 import pytest
+import struct
 import sys
 from functools import wraps
 from subprocess import Popen, PIPE
@@ -25,3 +26,139 @@ def async_test(f):
         if pending:
             loop.run_until_complete(asyncio.wait(pending))
     return wrapper
+
+
+class FakeContent:
+    """Stands for the content of a response, which receives chunks."""
+
+    def __init__(self, chunks):
+        self.chunks = list(chunks)
+
+    @asyncio.coroutine
+    def read(self, n=-1):
+        if self.chunks:
+            chunk = self.chunks.pop(0)
+            if 0 <= n < len(chunk):
+                chunk, rest = chunk[:n], chunk[n:]
+                self.chunks.insert(0, rest)
+            return chunk
+        return b''
+
+    @asyncio.coroutine
+    def readline(self):
+        line = b''
+        while not line.endswith(b'\n'):
+            chunk = yield from self.read()
+            if not chunk:
+                break
+            end = chunk.find(b'\n') + 1
+            if end and end < len(chunk):
+                chunk, rest = chunk[:end], chunk[end:]
+                self.chunks.insert(0, rest)
+            line += chunk
+        return line
+
+    @asyncio.coroutine
+    def readexactly(self, n):
+        data = b''
+        while len(data) < n:
+            chunk = yield from self.read(n - len(data))
+            if not chunk:
+                raise asyncio.IncompleteReadError(data, n)
+            data += chunk
+        return data
+
+
+class FakeResponse:
+    """Stands for a streamed response."""
+
+    status = 200
+
+    def __init__(self, chunks):
+        self.content = FakeContent(chunks)
+        self.closed = False
+
+    @asyncio.coroutine
+    def read(self):
+        data = b''.join(self.content.chunks)
+        self.content.chunks = []
+        return data
+
+    def close(self):
+        self.closed = True
+
+
+class FakeJSONResponse:
+    """Stands for a response holding a JSON document."""
+
+    def __init__(self, status, data):
+        self.status = status
+        self.data = data
+
+    @asyncio.coroutine
+    def json(self):
+        return self.data
+
+    @asyncio.coroutine
+    def text(self):
+        return json.dumps(self.data)
+
+    @asyncio.coroutine
+    def release(self):
+        pass
+
+
+class FakeAPI:
+    """
+    Stands for a DockerHandler. Requests are recorded into calls and
+    params, then answered by responder(method, path), which may be a
+    coroutine, or with response.
+    """
+
+    def __init__(self, response=None, *, responder=None, cache=None):
+        self.response = response
+        self.responder = responder
+        self.cache = cache
+        self.calls = []
+        self.params = None
+
+    @asyncio.coroutine
+    def request(self, method, path, *, params=None, **kwargs):
+        self.calls.append(path)
+        self.params = params
+        if self.responder is None:
+            return self.response
+        response = self.responder(method, path)
+        if asyncio.iscoroutine(response):
+            response = yield from response
+        return response
+
+    def get(self, path, **kwargs):
+        return self.request('GET', path, **kwargs)
+
+    def post(self, path, **kwargs):
+        return self.request('POST', path, **kwargs)
+
+    @asyncio.coroutine
+    def supports(self, version):
+        return True
+
+
+class FakeClock:
+    """Returns now, which moves forward by step on every call."""
+
+    def __init__(self, *, step=0):
+        self.now = 0
+        self.step = step
+
+    def __call__(self):
+        self.now += self.step
+        return self.now
+
+
+def split(data, size):
+    return [data[i:i + size] for i in range(0, len(data), size)]
+
+
+def frame(stream, data):
+    return struct.pack('>BxxxL', stream, len(data)) + data
@@ -0,0 +1,66 @@
+import io
+import pytest
+import tarfile
+from aiodocker.util import TarStream
+from conftest import async_test, FakeResponse, split
+
+
+def make_archive(format):
+    files = [
+        ('short.txt', b'hello\n'),
+        ('deep/' * 30 + 'long.txt', b'x' * 1000),
+        ('empty', b''),
+        ('caf\xe9.txt', b'bytes' * 300),
+    ]
+    out = io.BytesIO()
+    with tarfile.open(fileobj=out, mode='w', format=format) as tar:
+        info = tarfile.TarInfo('folder')
+        info.type = tarfile.DIRTYPE
+        tar.addfile(info)
+        for name, data in files:
+            info = tarfile.TarInfo(name)
+            info.size = len(data)
+            tar.addfile(info, io.BytesIO(data))
+        info = tarfile.TarInfo('link')
+        info.type = tarfile.SYMTYPE
+        info.linkname = 'target/' * 20
+        tar.addfile(info)
+    return out.getvalue(), files
+
+
+@async_test
+def test_tar_stream():
+    for format in (tarfile.GNU_FORMAT, tarfile.PAX_FORMAT):
+        archive, files = make_archive(format)
+        stream = TarStream(FakeResponse(split(archive, 700)))
+
+        member = yield from stream.read()
+        assert member.name == 'folder'
+        assert member.info.isdir()
+
+        for name, data in files:
+            member = yield from stream.read()
+            assert member.name == name
+            assert member.size == len(data)
+            # partially read, then skipped or fully read
+            assert (yield from member.read(3)) == data[:3]
+            if name != 'short.txt':
+                assert (yield from member.read()) == data[3:]
+                assert (yield from member.read()) == b''
+
+        member = yield from stream.read()
+        assert member.info.issym()
+        assert member.info.linkname == 'target/' * 20
+
+        assert (yield from stream.read()) is None
+        assert stream.response.closed
+
+
+@async_test
+def test_tar_stream_truncated():
+    archive, files = make_archive(tarfile.GNU_FORMAT)
+    stream = TarStream(FakeResponse([archive[:1200]]))
+    with pytest.raises(ValueError):
+        while True:
+            member = yield from stream.read()
+            yield from member.read()
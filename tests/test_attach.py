@@ -0,0 +1,58 @@
+import asyncio
+import os.path
+import pytest
+import struct
+import tempfile
+from aiodocker import DockerHandler
+from aiodocker.endpoints import ContainersEndpoint
+from aiodocker.exceptions import NotFound
+from conftest import async_test
+
+
+@asyncio.coroutine
+def fake_daemon(reader, writer):
+    """Echoes stdin into stdout and stderr."""
+    request = yield from reader.readline()
+    while (yield from reader.readline()).strip():
+        pass
+    if b'/containers/missing/' in request:
+        writer.write(b'HTTP/1.1 404 Not Found\r\n'
+                     b'Content-Length: 17\r\n\r\n'
+                     b'no such container')
+        writer.close()
+        return
+    writer.write(b'HTTP/1.1 101 UPGRADED\r\n'
+                 b'Content-Type: application/vnd.docker.raw-stream\r\n'
+                 b'Connection: Upgrade\r\n'
+                 b'Upgrade: tcp\r\n\r\n')
+    while True:
+        data = yield from reader.read(1024)
+        if not data:
+            break
+        writer.write(struct.pack('>BxxxL', 1, len(data)) + data)
+        writer.write(struct.pack('>BxxxL', 2, len(data)) + data.upper())
+    writer.close()
+
+
+@async_test
+def test_attach():
+    directory = tempfile.mkdtemp()
+    path = os.path.join(directory, 'docker.sock')
+    server = yield from asyncio.start_unix_server(fake_daemon, path)
+    api = DockerHandler('unix://%s' % path, '1.24')
+    try:
+        containers = ContainersEndpoint(api)
+        stream = yield from containers.attach('foo', tty=False)
+        yield from stream.write(memoryview(b'hello'))
+        assert (yield from stream.read()) == (1, b'hello')
+        assert (yield from stream.read()) == (2, b'HELLO')
+        stream.write_eof()
+        assert (yield from stream.read()) is None
+        stream.close()
+
+        with pytest.raises(NotFound):
+            yield from containers.attach('missing', tty=False)
+    finally:
+        api.close()
+        server.close()
+        yield from server.wait_closed()
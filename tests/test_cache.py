@@ -0,0 +1,143 @@
+import pytest
+from aiodocker import ResponseCache
+from aiodocker.endpoints import ContainersEndpoint
+from conftest import async_test, FakeAPI, FakeClock, FakeJSONResponse
+
+
+def test_ttl():
+    clock = FakeClock()
+    cache = ResponseCache(clock=clock)
+    cache.set('containers.inspect', 'foo', {'id': 'abc', 'name': '/foo'})
+    assert cache.get('containers.inspect', 'foo') == {'id': 'abc',
+                                                      'name': '/foo'}
+    clock.now = 10
+    with pytest.raises(KeyError):
+        cache.get('containers.inspect', 'foo')
+
+
+def test_lru():
+    cache = ResponseCache(2)
+    cache.set('images.items', 1, [])
+    cache.set('images.items', 2, [])
+    cache.get('images.items', 1)
+    cache.set('images.items', 3, [])
+    assert len(cache) == 2
+    with pytest.raises(KeyError):
+        cache.get('images.items', 2)
+
+
+def test_copies():
+    cache = ResponseCache()
+    cache.set('misc.info', (), {'containers': 1})
+    cache.get('misc.info', ())['containers'] = 2
+    assert cache.get('misc.info', ()) == {'containers': 1}
+
+
+def test_events():
+    cache = ResponseCache()
+    cache.set('containers.inspect', 'foo', {'id': 'abc', 'name': '/foo'})
+    cache.set('containers.inspect', 'bar', {'id': 'def', 'name': '/bar'})
+    cache.set('containers.items', (), [])
+    cache.set('images.items', (), [])
+
+    cache.feed({'status': 'die', 'id': 'abc', 'from': 'alpine', 'time': 1})
+    with pytest.raises(KeyError):
+        cache.get('containers.inspect', 'foo')
+    with pytest.raises(KeyError):
+        cache.get('containers.items', ())
+    assert cache.get('containers.inspect', 'bar')
+    assert cache.get('images.items', ()) == []
+
+    cache.feed({'status': 'untag', 'id': 'alpine:latest', 'time': 2})
+    with pytest.raises(KeyError):
+        cache.get('images.items', ())
+
+
+def test_image_events():
+    cache = ResponseCache()
+    cache.set('images.inspect', ('alpine',),
+              {'Id': 'sha256:aaa', 'RepoTags': ['alpine:latest']})
+    cache.set('images.history', ('alpine',), [], tags=['alpine'])
+    cache.set('images.inspect', ('busybox',),
+              {'Id': 'sha256:bbb', 'RepoTags': ['busybox:latest']})
+
+    cache.feed({'status': 'pull', 'id': 'alpine:latest', 'time': 1})
+    with pytest.raises(KeyError):
+        cache.get('images.inspect', ('alpine',))
+    with pytest.raises(KeyError):
+        cache.get('images.history', ('alpine',))
+    assert cache.get('images.inspect', ('busybox',))
+
+    cache.feed({'Type': 'image', 'Action': 'delete',
+                'Actor': {'ID': 'sha256:bbb'}})
+    with pytest.raises(KeyError):
+        cache.get('images.inspect', ('busybox',))
+
+
+def test_generation():
+    cache = ResponseCache()
+    generation = cache.generation
+    cache.feed({'status': 'start', 'id': 'abc', 'from': 'alpine'})
+    cache.set('containers.inspect', 'foo', {'id': 'abc'},
+              generation=generation)
+    with pytest.raises(KeyError):
+        cache.get('containers.inspect', 'foo')
+
+
+def test_generation_per_tag():
+    cache = ResponseCache()
+    generation = cache.generation
+    cache.feed({'status': 'start', 'id': 'def', 'from': 'alpine'})
+    cache.set('containers.inspect', 'foo', {'id': 'abc'},
+              generation=generation)
+    assert cache.get('containers.inspect', 'foo') == {'id': 'abc'}
+    cache.set('containers.items', (), [], generation=generation)
+    with pytest.raises(KeyError):
+        cache.get('containers.items', ())
+
+
+def test_generation_horizon():
+    cache = ResponseCache(2)
+    generation = cache.generation
+    cache.invalidate('a', 'b', 'c')
+    # the invalidation of a is forgotten
+    cache.set('containers.inspect', 'foo', {'id': 'a'},
+              generation=generation)
+    with pytest.raises(KeyError):
+        cache.get('containers.inspect', 'foo')
+
+
+@async_test
+def test_local_writes():
+    cache = ResponseCache()
+    cache.follow = lambda api: None
+
+    def responder(method, path):
+        if method == 'GET':
+            return FakeJSONResponse(200, {'Id': 'abc', 'Name': '/foo'})
+        return FakeJSONResponse(204, None)
+
+    api = FakeAPI(responder=responder, cache=cache)
+    containers = ContainersEndpoint(api)
+    yield from containers.inspect('foo')
+    yield from containers.inspect('foo')
+    assert api.calls == ['/containers/foo/json']
+    yield from containers.stop('foo')
+    yield from containers.inspect('foo')
+    assert api.calls == ['/containers/foo/json',
+                         '/containers/foo/stop',
+                         '/containers/foo/json']
+
+
+@async_test
+def test_cached_unhashable_arguments():
+    cache = ResponseCache()
+    # no daemon to follow
+    cache.follow = lambda api: None
+    api = FakeAPI(FakeJSONResponse(200, []), cache=cache)
+    containers = ContainersEndpoint(api)
+    label = ['com.example.role', 'com.example.tier=web']
+    assert (yield from containers.items(label=label)) == []
+    assert (yield from containers.items(label=list(label))) == []
+    assert api.calls == ['/containers/json']
+    assert api.params['filters']['label'] == label
@@ -59,3 +59,27 @@ def test_conflict():
 
     deleted = yield from client.containers.delete(container_id)
     assert not deleted, 'Should be already deleted'
+
+
+@async_test
+def test_many():
+    client = Docker.local_client()
+    refs = []
+    for i in range(3):
+        container_id = yield from client.containers.create(**{
+            'name': 'aio-many-%s' % i,
+            'image': 'gliderlabs/alpine:3.1',
+            'command': ['sleep', '60']
+        })
+        refs.append(container_id)
+
+    results = yield from client.containers.start_many(refs + ['aio-missing'],
+                                                      concurrency=2)
+    assert [results[ref] for ref in refs] == [True, True, True]
+    assert isinstance(results['aio-missing'], NotFound)
+
+    results = yield from client.containers.stop_many(refs, wait=1)
+    assert list(results.values()) == [True, True, True]
+
+    results = yield from client.containers.remove_many(refs)
+    assert list(results.values()) == [True, True, True]
@@ -0,0 +1,43 @@
+import asyncio
+import time
+from aiodocker import Docker
+from conftest import async_test
+
+
+@async_test
+def test_stream():
+    client = Docker.local_client()
+    stream = client.events.stream(since=int(time.time()),
+                                  filters={'event': ['create', 'destroy']})
+
+    container_id = yield from client.containers.create(**{
+        'name': 'aio-events',
+        'image': 'gliderlabs/alpine:3.1',
+        'command': ['sleep', '60']
+    })
+    deleted = yield from client.containers.delete(container_id)
+    assert deleted
+
+    event = yield from asyncio.wait_for(stream.read(), 10)
+    assert event['status'] == 'create'
+    assert event['id'] == container_id
+    event = yield from asyncio.wait_for(stream.read(), 10)
+    assert event['status'] == 'destroy'
+    stream.close()
+    assert (yield from stream.read()) is None
+
+
+@async_test
+def test_items():
+    client = Docker.local_client()
+    since = int(time.time())
+    container_id = yield from client.containers.create(**{
+        'name': 'aio-events',
+        'image': 'gliderlabs/alpine:3.1',
+        'command': ['sleep', '60']
+    })
+    yield from client.containers.delete(container_id)
+    events = yield from client.events.items(since=since,
+                                            until=int(time.time()) + 1)
+    assert [event['status'] for event in events
+            if event['id'] == container_id] == ['create', 'destroy']
@@ -2,7 +2,10 @@ import asyncio
 import pytest
 from aiodocker import Docker
 from aiodocker import ConflictError, NotFound
-from conftest import async_test
+from aiodocker.exceptions import ValidationError
+from aiodocker.endpoints import ExecEndpoint
+from conftest import async_test, FakeAPI, FakeJSONResponse, FakeResponse
+from conftest import frame
 
 
 @async_test
@@ -41,3 +44,88 @@ def test_execute():
 
     deleted = yield from client.containers.delete(container_id)
     assert deleted, 'Should be deleted'
+
+
+def exec_api(output, exit_code, delays=None):
+    """Runs every command with output and exit_code."""
+
+    @asyncio.coroutine
+    def respond(method, path):
+        if path.endswith('/start'):
+            return FakeResponse(output)
+        if method == 'GET':
+            return FakeJSONResponse(200, {'ID': 'e1', 'ExitCode': exit_code})
+        if delays:
+            yield from asyncio.sleep(delays[path.split('/')[2]])
+        return FakeJSONResponse(201, {'Id': 'e1'})
+    return FakeAPI(responder=respond)
+
+
+@async_test
+def test_run():
+    api = exec_api([frame(1, b'foo\n'), frame(2, b'bar\n')], 3)
+    run = ExecEndpoint(api).run('c1', ['sh', '-c', 'foo'])
+    assert (yield from run.read()) == (1, b'foo\n')
+    result = yield from run.result()
+    assert result.exit_code == 3
+    assert result.stdout is None
+    assert api.calls == ['/containers/c1/exec', '/exec/e1/start',
+                         '/exec/e1/json']
+
+
+@async_test
+def test_run_closed_before_read():
+    api = exec_api([frame(1, b'foo\n')], 0)
+    run = ExecEndpoint(api).run('c1', ['true'])
+    run.close()
+    with pytest.raises(ValidationError):
+        yield from run.result()
+    assert api.calls == []
+
+
+@async_test
+def test_run_collect():
+    api = exec_api([frame(1, b'x' * 10), frame(2, b'oops'),
+                    frame(1, b'y' * 10)], 0)
+    result = yield from ExecEndpoint(api).run('c1', ['cat']).collect(16)
+    assert result == (0, b'x' * 10 + b'y' * 6, b'oops', True)
+
+
+@async_test
+def test_run_many():
+    api = exec_api([frame(1, b'ok\n')], 0,
+                   {'a': 0.05, 'b': 0.01, 'c': 0.02, 'd': 1})
+    results = ExecEndpoint(api).run_many('abcd', ['true'], concurrency=2,
+                                         timeout=0.5)
+    outcomes = []
+    while True:
+        outcome = yield from results.read()
+        if outcome is None:
+            break
+        outcomes.append(outcome)
+    assert [ref for ref, _ in outcomes] == ['b', 'c', 'a', 'd']
+    assert outcomes[0][1] == (0, b'ok\n', b'', False)
+    assert isinstance(outcomes[-1][1], asyncio.TimeoutError)
+
+
+@async_test
+def test_run_many_close():
+    api = exec_api([frame(1, b'ok\n')], 0, {'a': 0.01, 'b': 10, 'c': 10})
+    results = ExecEndpoint(api).run_many('abc', ['true'], concurrency=2)
+    ref, result = yield from results.read()
+    assert ref == 'a'
+    results.close()
+    assert (yield from results.read()) is None
+
+
+@async_test
+def test_open_tty():
+    def respond(method, path):
+        if method == 'GET':
+            return FakeJSONResponse(200, {'ID': 'e1',
+                                          'ProcessConfig': {'tty': True}})
+        return FakeResponse([b'foo', b'bar\n'])
+    api = FakeAPI(responder=respond)
+    stream = yield from ExecEndpoint(api).open('e1')
+    assert api.calls == ['/exec/e1/json', '/exec/e1/start']
+    assert (yield from stream.read()) == (1, b'foo')
@@ -0,0 +1,231 @@
+import asyncio
+import gzip
+import io
+import json
+import os
+import pytest
+import socket
+import tempfile
+from aiodocker.helpers import copy_stream, file_sender, stream_json
+from aiodocker.helpers import stream_raw, threaded, BatchWriter
+from conftest import async_test, FakeResponse, frame, split
+
+
+@async_test
+def test_stream_json():
+    documents = [
+        {'status': 'Downloading', 'progress': '[=>  ]'},
+        {'status': 'Téléchargé'},
+        {'stream': 'Successfully built 4fa6e0f0c678\n'},
+    ]
+    data = b''.join(json.dumps(doc, ensure_ascii=False).encode('utf-8') +
+                    b'\r\n' for doc in documents)
+    for size in (1, 3, 7, len(data)):
+        stream = stream_json(FakeResponse(split(data, size)))
+        results = []
+        while True:
+            doc = yield from stream.read()
+            if doc is None:
+                break
+            results.append(doc)
+        assert results == documents
+
+
+@async_test
+def test_stream_json_truncated():
+    stream = stream_json(FakeResponse([b'{"status": "ok"}{"stat']))
+    assert (yield from stream.read()) == {'status': 'ok'}
+    with pytest.raises(ValueError):
+        yield from stream.read()
+
+
+@async_test
+def test_stream_raw():
+    data = frame(1, b'hello\n') + frame(2, 'oops é\n'.encode('utf-8')) + \
+        frame(1, b'')
+    stream = stream_raw(FakeResponse(split(data, 3)))
+    stream_id, payload = yield from stream.read()
+    assert stream_id == 1
+    assert isinstance(payload, memoryview)
+    assert payload == b'hello\n'
+    assert (yield from stream.read_text()) == ('stderr', 'oops é\n')
+    assert (yield from stream.read_text()) == ('stdout', '')
+    assert (yield from stream.read()) is None
+
+
+@async_test
+def test_stream_raw_pipe():
+    data = frame(1, b'out') + frame(2, b'err') + frame(1, b'put')
+    stdout, stderr = io.BytesIO(), io.StringIO()
+    stream = stream_raw(FakeResponse(split(data, 5)))
+    written = yield from stream.pipe(stdout=stdout, stderr=stderr)
+    assert stdout.getvalue() == b'output'
+    assert stderr.getvalue() == 'err'
+    assert written == {1: 6, 2: 3}
+
+
+
+def test_threaded():
+    assert not threaded(io.BytesIO())
+    assert not threaded(io.TextIOWrapper(io.BytesIO()))
+    with tempfile.TemporaryFile() as file:
+        assert threaded(file)
+        assert threaded(file.fileno())
+
+
+@async_test
+def test_stream_raw_pipe_file():
+    frames = [frame(1, ('line %d\n' % i).encode()) for i in range(1000)]
+    with tempfile.TemporaryFile() as file:
+        stream = stream_raw(FakeResponse(frames))
+        written = yield from stream.pipe(stdout=file, batch=1024)
+        file.seek(0)
+        expected = ''.join('line %d\n' % i for i in range(1000)).encode()
+        assert file.read() == expected
+        assert written == {1: len(expected), 2: 0}
+
+
+@async_test
+def test_batch_writer():
+    calls = []
+
+    @asyncio.coroutine
+    def write(data):
+        calls.append(bytes(data))
+        yield from asyncio.sleep(0.001)
+
+    batch = BatchWriter(write, size=10)
+    for i in range(30):
+        yield from batch(b'x')
+    yield from batch.flush()
+    assert b''.join(calls) == b'x' * 30
+    # gathered while the previous call was in flight
+    assert len(calls) < 30
+    assert max(len(data) for data in calls) <= 10
+
+
+@async_test
+def test_copy_stream():
+    data = os.urandom(100000) * 3
+    calls = []
+    sink = io.BytesIO()
+    copied = yield from copy_stream(FakeResponse(split(data, 4096)), sink,
+                                    chunk_size=65536,
+                                    progress=lambda *a: calls.append(a))
+    assert copied == len(data)
+    assert sink.getvalue() == data
+    assert [size for size, rate in calls] == \
+        list(range(65536, len(data), 65536)) + [len(data)]
+
+    sink = io.BytesIO()
+    yield from copy_stream(FakeResponse(split(data, 4096)), sink,
+                           compress=True)
+    assert gzip.decompress(sink.getvalue()) == data
+
+
+@async_test
+def test_copy_stream_socket():
+    data = b'x' * 10000
+    for blocking in (True, False):
+        left, right = socket.socketpair()
+        left.setblocking(blocking)
+        yield from copy_stream(FakeResponse(split(data, 1000)), left,
+                               chunk_size=4096)
+        # the mode of the socket is left as is
+        assert left.gettimeout() == (None if blocking else 0)
+        left.close()
+        received = b''
+        while len(received) < len(data):
+            received += right.recv(65536)
+        right.close()
+        assert received == data
+
+
+@async_test
+def test_copy_stream_fd():
+    data = os.urandom(300000)
+    calls = []
+    with tempfile.TemporaryFile() as file:
+        copied = yield from copy_stream(FakeResponse(split(data, 10000)),
+                                        file.fileno(),
+                                        progress=lambda *a: calls.append(a))
+        file.seek(0)
+        assert file.read() == data
+    assert copied == len(data)
+    # chunks grow from 64 KiB
+    assert [size for size, rate in calls] == \
+        [65536, 65536 * 3, len(data)]
+
+
+@async_test
+def test_copy_stream_text_file():
+    data = os.urandom(100000)
+    with tempfile.TemporaryFile('w+') as file:
+        file.write('text first ')
+        yield from copy_stream(FakeResponse(split(data, 4096)), file)
+        file.buffer.seek(0)
+        # binary data is not decoded
+        assert file.buffer.read() == b'text first ' + data
+
+    with pytest.raises(TypeError):
+        yield from copy_stream(FakeResponse([data]), io.StringIO())
+
+
+class BrokenSink:
+
+    def __init__(self):
+        self.calls = 0
+
+    @asyncio.coroutine
+    def write(self, data):
+        self.calls += 1
+        raise OSError('disk full')
+
+
+@async_test
+def test_copy_stream_broken_sink():
+    sink = BrokenSink()
+    response = FakeResponse(split(b'x' * 10000000, 65536))
+    with pytest.raises(OSError):
+        yield from copy_stream(response, sink, chunk_size=65536, depth=2)
+    assert sink.calls == 1
+    # reading stopped early
+    assert response.content.chunks
+
+
+@asyncio.coroutine
+def send(body):
+    """Consumes a request body like aiohttp does."""
+    chunks, value = [], None
+    while True:
+        try:
+            result = body.send(value)
+        except StopIteration:
+            return chunks
+        value = None
+        if isinstance(result, (bytes, bytearray)):
+            chunks.append(result)
+        else:
+            yield from asyncio.wait([result])
+            value = result.result()
+
+
+@async_test
+def test_file_sender():
+    data = os.urandom(300000)
+    with tempfile.TemporaryFile() as file:
+        file.write(b'skipped' + data)
+        file.seek(7)
+        chunks = yield from send(file_sender(file, chunk_size=65536))
+    assert b''.join(chunks) == data
+    assert [len(chunk) for chunk in chunks[:4]] == [65536] * 4
+
+    chunks = yield from send(file_sender(io.BytesIO(data), chunk_size=1000))
+    assert b''.join(chunks) == data
+
+    read, write = os.pipe()
+    os.write(write, b'piped')
+    os.close(write)
+    chunks = yield from send(file_sender(read))
+    os.close(read)
+    assert chunks == [b'piped']
@@ -0,0 +1,48 @@
+import pytest
+from aiodocker import PrefixIndex, AmbiguousError, NotFound
+from aiodocker.formatters import from_containers, from_images
+
+
+def test_containers():
+    containers = from_containers([
+        {'Id': '4fa6e0f0c678', 'Names': ['/web']},
+        {'Id': '4fb13c8a2f11', 'Names': ['/db']},
+        {'Id': 'c2ad9b8e1a33', 'Names': ['/4f']},
+    ])
+    index = PrefixIndex(containers)
+    assert index.resolve('4fa')['id'] == '4fa6e0f0c678'
+    assert index.resolve('web')['id'] == '4fa6e0f0c678'
+    assert index.resolve('/db')['id'] == '4fb13c8a2f11'
+    # names win over prefixes
+    assert index.resolve('4f')['id'] == 'c2ad9b8e1a33'
+    with pytest.raises(AmbiguousError):
+        index.resolve('4')
+    with pytest.raises(NotFound):
+        index.resolve('ff')
+    with pytest.raises(NotFound):
+        index.resolve('we')
+
+
+def test_images():
+    images = from_images([
+        {'Id': 'sha256:017a8c79268d', 'RepoTags': ['aio:latest']},
+        {'Id': 'sha256:01ab0e1e5b4c', 'RepoTags': ['<none>:<none>']},
+    ])
+    index = PrefixIndex(images)
+    assert index.resolve('aio')['id'] == 'sha256:017a8c79268d'
+    assert index.resolve('aio:latest')['id'] == 'sha256:017a8c79268d'
+    assert index.resolve('sha256:01a')['id'] == 'sha256:01ab0e1e5b4c'
+    assert '<none>:<none>' not in index
+    assert len(index) == 2
+
+
+def test_mutations():
+    index = PrefixIndex()
+    record = {'id': 'abc', 'names': ['/foo']}
+    index.add(record)
+    index.add({'id': 'abd', 'names': ['/bar']})
+    with pytest.raises(AmbiguousError):
+        index.resolve('ab')
+    index.discard(record)
+    assert index.resolve('ab')['id'] == 'abd'
+    assert index.get('foo') is None
@@ -0,0 +1,258 @@
+import asyncio
+import pytest
+from aiodocker.endpoints.containers import ContainerLog
+from aiodocker.logs import LogCursor, LogMerge, LogRecord, LogRing
+from aiodocker.logs import parse_record, parse_timestamp
+from aiodocker.util import task
+from collections import OrderedDict
+from datetime import datetime, timezone
+from conftest import async_test, FakeAPI, FakeClock, FakeJSONResponse
+from conftest import FakeResponse, frame, split
+
+
+@async_test
+def test_follow_backpressure():
+    chunks = [frame(1, ('line %d\n' % i).encode()) for i in range(100)]
+    api = FakeAPI(FakeResponse(chunks))
+    logs = ContainerLog(api, 'foo', tty=False).tail(10)
+    stream = logs.follow(since=12, maxsize=4)
+
+    assert (yield from stream.read()) == (1, b'line 0\n')
+    assert api.params['follow'] is True
+    assert api.params['since'] == 12
+    assert api.params['tail'] == 10
+    yield from asyncio.sleep(0.01)
+    # the consumer is slow, the socket is not read anymore
+    assert len(api.response.content.chunks) > 90
+
+    lines = [b'line 0\n']
+    while True:
+        data = yield from stream.read()
+        if data is None:
+            break
+        lines.append(bytes(data[1]))
+    assert lines == [('line %d\n' % i).encode() for i in range(100)]
+    assert api.response.closed
+
+
+@async_test
+def test_follow_close():
+    api = FakeAPI(FakeResponse([frame(2, b'oops\n')] * 10))
+    stream = ContainerLog(api, 'foo', tty=False).follow(maxsize=1)
+    assert (yield from stream.read()) == (2, b'oops\n')
+    stream.close()
+    assert (yield from stream.read()) is None
+    yield from asyncio.sleep(0)
+    assert api.response.closed
+
+
+def test_parse_timestamp():
+    expected = datetime(2015, 8, 21, 9, 50, 16, tzinfo=timezone.utc)
+    expected = int(expected.timestamp()) * 1000000000
+    assert parse_timestamp(b'2015-08-21T09:50:16.000000000Z') == expected
+    assert parse_timestamp('2015-08-21T09:50:16.123456789Z') \
+        == expected + 123456789
+    assert parse_timestamp('2015-08-21T09:50:16.1234Z') \
+        == expected + 123400000
+    assert parse_timestamp('2015-08-21T09:50:16Z') == expected
+    assert parse_timestamp('2015-08-21T07:50:16.5-02:00') \
+        == expected + 500000000
+    with pytest.raises(ValueError):
+        parse_timestamp('21/08/2015 09:50:16')
+
+
+def test_parse_record():
+    record = parse_record((2, memoryview(
+        b'2015-08-21T09:50:16.000000001Z hello world\n')))
+    assert record.timestamp == 1440150616000000001
+    assert record.stream == 2
+    assert bytes(record.payload) == b'hello world\n'
+
+
+@async_test
+def test_cursor_resume():
+    chunks = [frame(1, ('2015-08-21T09:50:16.00000000%dZ line %d\n'
+                        % (i, i)).encode()) for i in range(5)]
+    api = FakeAPI(FakeResponse(chunks))
+    logs = ContainerLog(api, 'foo', tty=False).tail(1)
+    cursor = logs.cursor(last=1440150616000000002, reconnect=False)
+    records = []
+    while True:
+        record = yield from cursor.read()
+        if record is None:
+            break
+        records.append(bytes(record.payload))
+    assert records == [b'line 3\n', b'line 4\n']
+    assert api.params['since'] == 1440150616
+    assert api.params['tail'] == 'all'
+    assert cursor.last == 1440150616000000004
+
+
+@async_test
+def test_cursor_tty():
+    lines = b''.join(record(i, 'line %d' % i)[8:] for i in range(3))
+
+    def respond(method, path):
+        if path.endswith('/json'):
+            return FakeJSONResponse(200, {'Config': {'Tty': True}})
+        return FakeResponse(split(lines, 7))
+    api = FakeAPI(responder=respond)
+    cursor = ContainerLog(api, 'foo').cursor(reconnect=False)
+    records = []
+    while True:
+        data = yield from cursor.read()
+        if data is None:
+            break
+        records.append((data.stream, bytes(data.payload)))
+    # not framed, read line by line
+    assert records == [(1, b'line 0\n'), (1, b'line 1\n'), (1, b'line 2\n')]
+    assert api.calls == ['/containers/foo/json', '/containers/foo/logs']
+
+
+def record(nanos, text):
+    line = '2015-08-21T09:50:16.%09dZ %s\n' % (nanos, text)
+    return frame(1, line.encode())
+
+
+@async_test
+def test_cursor_same_timestamp():
+    responses = [
+        # the connection is lost after a truncated frame
+        FakeResponse([record(1, 'a'), record(1, 'b'), record(1, 'b'),
+                      b'\x01\x00']),
+        FakeResponse([record(1, 'a'), record(1, 'b'), record(1, 'b'),
+                      record(1, 'c'), record(2, 'd')]),
+    ]
+    since = []
+
+    def respond(method, path):
+        if path.endswith('/logs'):
+            since.append(api.params.get('since'))
+            return responses.pop(0)
+        return FakeJSONResponse(404, 'no such container')
+    api = FakeAPI(responder=respond)
+    cursor = LogCursor(ContainerLog(api, 'foo', tty=False), delay=0)
+    records = []
+    while True:
+        data = yield from cursor.read()
+        if data is None:
+            break
+        records.append(bytes(data.payload))
+    # distinct lines sharing a timestamp are all delivered once
+    assert records == [b'a\n', b'b\n', b'b\n', b'c\n', b'd\n']
+    assert since == [None, 1440150616]
+    assert cursor.last == 1440150616000000002
+
+
+class FakeCursor:
+    """Delivers the timestamps pushed, None ends it."""
+
+    def __init__(self, timestamps=()):
+        self.queue = asyncio.Queue()
+        self.closed = False
+        for timestamp in timestamps:
+            self.push(timestamp)
+
+    def push(self, timestamp):
+        self.queue.put_nowait(timestamp)
+
+    @asyncio.coroutine
+    def read(self):
+        timestamp = yield from self.queue.get()
+        if timestamp is None:
+            return None
+        return LogRecord(timestamp, 1, memoryview(b''))
+
+    def close(self):
+        self.closed = True
+
+
+@asyncio.coroutine
+def consume(stream):
+    results = []
+    while True:
+        data = yield from stream.read()
+        if data is None:
+            return results
+        results.append((data[0], data[1].timestamp))
+
+
+@async_test
+def test_merge():
+    cursors = OrderedDict([
+        ('c', FakeCursor([3, 6, 9, None])),
+        ('b', FakeCursor([2, 5, 8, 9, None])),
+        ('a', FakeCursor([1, 4, 7, None])),
+    ])
+    # the clock does not move, every source is waited for
+    merged = LogMerge(cursors, lag=60, clock=FakeClock())
+    results = yield from consume(merged)
+    assert [ts for _, ts in results] == [1, 2, 3, 4, 5, 6, 7, 8, 9, 9]
+    assert results[:3] == [('a', 1), ('b', 2), ('c', 3)]
+    # same timestamp, in the order of the sources
+    assert results[-2:] == [('c', 9), ('b', 9)]
+    assert merged.watermark == 9
+    assert merged.late == 0
+    assert all(cursor.closed for cursor in cursors.values())
+
+
+@task
+def read(stream):
+    return (yield from stream.read())
+
+
+@async_test
+def test_merge_lag():
+    fast = FakeCursor([2, 3, 4, None])
+    slow = FakeCursor()
+    quiet = FakeCursor()
+    cursors = OrderedDict([('fast', fast), ('slow', slow), ('quiet', quiet)])
+    merged = LogMerge(cursors, lag=0, lags={'slow': 60}, clock=FakeClock())
+
+    # slow is waited for, quiet is not
+    pending = read(merged)
+    for i in range(5):
+        yield from asyncio.sleep(0)
+    assert not pending.done()
+    slow.push(1)
+    slow.push(None)
+    assert (yield from pending)[0] == 'slow'
+    for timestamp in (2, 3, 4):
+        ref, record = yield from merged.read()
+        assert (ref, record.timestamp) == ('fast', timestamp)
+
+    # late records are still delivered
+    pending = read(merged)
+    yield from asyncio.sleep(0)
+    assert not pending.done()
+    quiet.push(0)
+    quiet.push(None)
+    assert (yield from pending)[0] == 'quiet'
+    assert (yield from merged.read()) is None
+    assert merged.watermark == 4
+    assert merged.late == 1
+
+
+def test_ring():
+    ring = LogRing(size=16, lines=3)
+    for i in range(5):
+        ring.feed(LogRecord(i, 1, memoryview(('line %d\n' % i).encode())))
+    # every line is 7 bytes, only 2 fit
+    assert len(ring) == 2
+    assert ring.used == 14
+    assert ring.last == 4
+    assert [r.payload for r in ring.tail(5)] == [b'line 3\n', b'line 4\n']
+    assert ring[-1] == LogRecord(4, 1, b'line 4\n')
+    assert ring[0].timestamp == 3
+
+    for i in range(5, 8):
+        ring.feed(LogRecord(i, 2, memoryview(str(i).encode())))
+    # bounded by lines now
+    assert [r.payload for r in ring[-3:]] == [b'5', b'6', b'7']
+    assert ring.tail(0) == []
+
+    ring.feed(LogRecord(8, 1, memoryview(b'x' * 20 + b'0123456789abcdef')))
+    assert ring[:] == [LogRecord(8, 1, b'0123456789abcdef')]
+    assert len(ring.buffer) == 16
+    with pytest.raises(IndexError):
+        ring[1]
@@ -0,0 +1,104 @@
+import asyncio
+import pytest
+from aiodocker import Docker, ResponseCache, StateMirror
+from conftest import async_test, FakeAPI
+
+
+@async_test
+def test_mirror():
+    client = Docker.local_client()
+    mirror = StateMirror(client)
+    yield from mirror.start()
+    assert mirror.container('aio-mirror') is None
+
+    changes = []
+    mirror.on_change(lambda *args: changes.append(args[:2]))
+
+    container_id = yield from client.containers.create(**{
+        'name': 'aio-mirror',
+        'image': 'gliderlabs/alpine:3.1',
+        'command': ['sleep', '60']
+    })
+    yield from client.containers.start(container_id)
+    yield from asyncio.sleep(1)
+    assert mirror.is_running('aio-mirror')
+    assert mirror.container(container_id) in mirror.containers(
+        state='running')
+
+    yield from client.containers.stop(container_id)
+    yield from client.containers.delete(container_id)
+    yield from asyncio.sleep(1)
+    assert mirror.container('aio-mirror') is None
+    assert ('container', 'added') in changes
+    assert ('container', 'removed') in changes
+
+    assert not (yield from mirror.check())
+    mirror.close()
+
+
+class FakeEvents:
+
+    def __init__(self, error=None):
+        self.error = error
+        self.closed = False
+        self.wakeup = asyncio.Future()
+
+    @asyncio.coroutine
+    def read(self):
+        if self.error is not None:
+            raise self.error
+        yield from self.wakeup
+
+    def close(self):
+        self.closed = True
+
+
+class FakeClient:
+
+    def __init__(self, *streams, cache=None):
+        self.streams = list(streams)
+        self.api = FakeAPI(cache=cache)
+        self.containers = self.images = self
+        self.events = self
+
+    @asyncio.coroutine
+    def items(self, **kwargs):
+        return []
+
+    @asyncio.coroutine
+    def inspect(self, ref):
+        return {'id': ref, 'name': '/foo', 'state': {'running': True}}
+
+    def stream(self, *, since):
+        return self.streams.pop(0)
+
+
+@async_test
+def test_mirror_restarts_follower():
+    broken, working = FakeEvents(OSError('connection lost')), FakeEvents()
+    mirror = StateMirror(FakeClient(broken, working))
+    yield from mirror.start()
+    yield from asyncio.sleep(0)
+    assert broken.closed
+    assert mirror.follower is None
+
+    yield from mirror.resync()
+    follower = mirror.follower
+    assert not follower.done()
+    yield from mirror.resync()
+    assert mirror.follower is follower
+    mirror.close()
+    yield from asyncio.sleep(0)
+    assert working.closed
+
+
+@async_test
+def test_mirror_refreshes_cached_inspect():
+    cache = ResponseCache()
+    cache.set('containers.inspect', (('abc',), ()), {'id': 'abc'},
+              tags=['abc'])
+    mirror = StateMirror(FakeClient(cache=cache))
+    yield from mirror._apply({'status': 'rename', 'id': 'abc'})
+    with pytest.raises(KeyError):
+        cache.get('containers.inspect', (('abc',), ()))
+    assert mirror.container('foo')['state'] == 'running'
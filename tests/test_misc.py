@@ -1,6 +1,7 @@
+import asyncio
 import pytest
-from aiodocker import Docker
-from conftest import async_test
+from aiodocker import Docker, DockerHandler
+from conftest import async_test, FakeResponse
 
 
 @async_test
@@ -21,3 +22,81 @@ def test_version():
 def test_ping():
     client = Docker.local_client()
     assert (yield from client.ping())
+
+
+@async_test
+def test_pooled_session():
+    with Docker.local_client(pool_size=2) as client:
+        connector = client.api.connector
+        create = connector._create_connection
+        created = []
+
+        @asyncio.coroutine
+        def create_connection(req):
+            created.append(req)
+            return (yield from create(req))
+        connector._create_connection = create_connection
+
+        for i in range(10):
+            assert (yield from client.ping())
+        # sequential calls go through one keep-alive connection
+        assert len(created) == 1
+    assert client.api.closed
+
+
+@async_test
+def test_coalesce():
+    client = Docker.local_client(coalesce=True)
+    tasks = [client.info() for i in range(20)]
+    results = yield from asyncio.gather(*tasks)
+    assert all(result == results[0] for result in results)
+    assert not client.api._inflight
+
+
+class FakeSession:
+
+    def __init__(self):
+        self.calls = []
+        self.ready = asyncio.Future()
+
+    @asyncio.coroutine
+    def request(self, method, url, **kwargs):
+        self.calls.append((method, url))
+        yield from self.ready
+        return FakeResponse([b'{}'])
+
+    def close(self):
+        pass
+
+
+@async_test
+def test_single_flight():
+    api = DockerHandler('unix:///var/run/docker.sock', '1.24',
+                        coalesce=True)
+    api.session = FakeSession()
+    try:
+        tasks = [api.get('info', params={'all': True}) for i in range(5)]
+        while not api.session.calls:
+            yield from asyncio.sleep(0)
+        api.session.ready.set_result(None)
+        responses = yield from asyncio.gather(*tasks)
+    finally:
+        api.close()
+    # one http request for every caller
+    assert len(api.session.calls) == 1
+    assert api.session.calls[0][1].endswith('/v1.24/info')
+    assert all(response is responses[0] for response in responses)
+    assert not api._inflight
+
+
+@async_test
+def test_negotiation():
+    client = Docker.local_client()
+    assert client.api.version is None
+    assert (yield from client.ping())
+    assert client.api.version is not None
+    assert (yield from client.api.supports('1.17'))
+
+    client = Docker.local_client(version='1.17')
+    assert (yield from client.api.negotiate()) == '1.17'
+    assert not (yield from client.api.supports('1.18'))
@@ -0,0 +1,32 @@
+import pytest
+from aiodocker import Docker, DockerPool, UnavailableError
+from conftest import async_test
+
+
+@async_test
+def test_pool():
+    client = Docker.local_client()
+    unreachable = Docker('tcp://127.0.0.1:1')
+    pool = DockerPool([client, unreachable], timeout=2)
+    healthy = yield from pool.start()
+    assert healthy == {client}
+    assert pool.choose() is client
+
+    chosen, container_id = yield from pool.run('aio-pool', **{
+        'image': 'gliderlabs/alpine:3.1',
+        'command': ['sleep', '60']
+    })
+    assert chosen is client
+
+    containers = yield from pool.containers(status='running')
+    assert {'id': container_id} in containers
+    assert all(c['host'] == client.api.host for c in containers)
+
+    yield from client.containers.remove(container_id, force=True)
+    pool.close()
+
+
+def test_empty_pool():
+    pool = DockerPool([])
+    with pytest.raises(UnavailableError):
+        pool.choose()
@@ -0,0 +1,154 @@
+import asyncio
+import json
+import pytest
+from aiodocker.stats import StatsCollector, StatsStream, usage
+from conftest import async_test, FakeAPI, FakeClock, FakeResponse, split
+
+
+def document(second, *, cpu, system, rx, read):
+    return {
+        'read': '2015-08-21T09:50:%02d.000000000Z' % second,
+        'cpu_stats': {
+            'cpu_usage': {'total_usage': cpu, 'percpu_usage': [0, 0]},
+            'system_cpu_usage': system,
+        },
+        'memory_stats': {'usage': 256, 'limit': 1024},
+        'networks': {
+            'eth0': {'rx_bytes': rx, 'tx_bytes': 0},
+            'eth1': {'rx_bytes': rx, 'tx_bytes': 10},
+        },
+        'blkio_stats': {
+            'io_service_bytes_recursive': [
+                {'op': 'Read', 'value': read},
+                {'op': 'Write', 'value': 0},
+                {'op': 'Total', 'value': read},
+            ]
+        },
+    }
+
+
+def test_usage():
+    first = document(0, cpu=100, system=1000, rx=0, read=0)
+    second = document(2, cpu=200, system=2000, rx=100, read=50)
+    sample = usage(first)
+    assert sample['cpu_percent'] is None
+    assert sample['rx_rate'] is None
+    assert sample['memory_percent'] == 25
+
+    sample = usage(second, first)
+    assert sample['cpu_percent'] == 20
+    assert sample['rx_bytes'] == 200
+    assert sample['tx_bytes'] == 10
+    assert sample['rx_rate'] == 100
+    assert sample['tx_rate'] == 0
+    assert sample['blkio_read'] == 50
+    assert sample['blkio_read_rate'] == 25
+
+
+@async_test
+def test_stats_stream_interval():
+    lines = [json.dumps(document(i, cpu=i * 10, system=i * 100,
+                                 rx=i, read=0)).encode('utf-8') + b'\n'
+             for i in range(11)]
+    # the last document is broken, it must not be decoded
+    lines[-1] = b'{"read": \n'
+    api = FakeAPI(FakeResponse(split(b''.join(lines), 100)))
+    stream = StatsStream(api, 'foo', interval=3, clock=FakeClock(step=1))
+    samples = []
+    while True:
+        sample = yield from stream.read()
+        if sample is None:
+            break
+        samples.append(sample)
+    assert [s['rx_bytes'] for s in samples] == [0, 6, 12, 18]
+    assert samples[1]['cpu_percent'] == 20
+    assert samples[1]['rx_rate'] == 2
+    assert stream.skipped == 7
+    assert api.response.closed
+
+
+class FakeContainers:
+
+    def __init__(self, documents, gate):
+        self.documents = documents
+        self.gate = gate
+
+    @asyncio.coroutine
+    def items(self, *, status):
+        return [{'id': ref} for ref in self.documents]
+
+    def stats_stream(self, ref, *, interval, raw):
+        return FakeStream(self.documents[ref], self.gate)
+
+
+class FakeStream:
+
+    def __init__(self, documents, gate):
+        self.documents = list(documents)
+        self.gate = gate
+
+    @asyncio.coroutine
+    def read(self):
+        yield from asyncio.sleep(0)
+        if self.gate is not None:
+            yield from self.gate
+        return self.documents.pop(0) if self.documents else None
+
+    def close(self):
+        pass
+
+
+class FakeClient:
+
+    def __init__(self, documents, gate=None):
+        self.containers = FakeContainers(documents, gate)
+
+
+@async_test
+def test_collector():
+    pytest.importorskip('numpy')
+    documents = {}
+    for i in range(5):
+        documents['c%d' % i] = [
+            document(0, cpu=0, system=0, rx=0, read=0),
+            document(2, cpu=i * 100, system=1000, rx=i * 10, read=i),
+        ]
+    collector = StatsCollector(FakeClient(documents), concurrency=2)
+    yield from collector.start()
+    for i in range(10):
+        yield from asyncio.sleep(0)
+    collector.close()
+
+    assert len(collector) == 5
+    snapshot = collector.snapshot()
+    cpu = dict(zip(snapshot['ids'], snapshot['cpu_percent']))
+    assert cpu == {'c0': 0, 'c1': 20, 'c2': 40, 'c3': 60, 'c4': 80}
+    rx = dict(zip(snapshot['ids'], snapshot['rx_rate']))
+    assert rx['c4'] == 40
+
+    assert collector.top('cpu_percent', 2) == [('c4', 80.0), ('c3', 60.0)]
+    assert collector.percentiles('memory_percent', (50,)) == {50: 25}
+
+    collector.remove('c1')
+    assert len(collector) == 4
+    assert 'c1' not in collector.snapshot()['ids']
+    assert collector.top('cpu_percent', 1) == [('c4', 80.0)]
+
+
+@async_test
+def test_collector_remove_while_reading(caplog):
+    pytest.importorskip('numpy')
+    gate = asyncio.Future()
+    documents = {'c0': [document(0, cpu=0, system=0, rx=0, read=0)]}
+    collector = StatsCollector(FakeClient(documents, gate), concurrency=1)
+    yield from collector.start()
+    for i in range(5):
+        yield from asyncio.sleep(0)
+    # the document arrives once the container is removed
+    collector.remove('c0')
+    gate.set_result(None)
+    for i in range(5):
+        yield from asyncio.sleep(0)
+    collector.close()
+    assert len(collector) == 0
+    assert 'cannot stream stats' not in caplog.text